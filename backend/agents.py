@@ -1,10 +1,69 @@
 # backend/agents.py
-from langchain_openai import ChatOpenAI
-from tools import google_ad_transparency
+import functools
+import threading
 
-llm = ChatOpenAI(temperature=0)
-tools = [google_ad_transparency]
-llm_with_tools = llm.bind_tools(tools)
+
+# The OpenAI client, tool objects and their binding are built on first use so
+# importing this module (and everything that imports it) stays cheap.
+
+_instances = {}
+_instances_lock = threading.RLock()   # re-entrant: getters build on each other
+
+
+def _once(build):
+    """Memoise a zero-argument builder; concurrent first calls build it only once."""
+    @functools.wraps(build)
+    def getter():
+        with _instances_lock:
+            if build not in _instances:
+                _instances[build] = build()
+            return _instances[build]
+    return getter
+
+
+@_once
+def get_llm():
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(temperature=0)
+
+
+@_once
+def get_tools():
+    from tools import google_ad_transparency
+    return [google_ad_transparency]
+
+
+@_once
+def get_llm_with_tools():
+    return get_llm().bind_tools(get_tools())
+
+
+# Replaces the chat model for every node when set, e.g. a stub for load tests.
+_llm_override = None
+
+
+def override_llm(llm) -> None:
+    """Route all conversational turns to `llm` (None restores the real model)."""
+    global _llm_override
+    _llm_override = llm
+
+
+@_once
+def get_llm_cache():
+    from llm_cache import default_cache
+    return default_cache()
+
+
+@_once
+def get_cached_llm_with_tools():
+    """`get_llm_with_tools()` behind the exact-match response cache (if enabled)."""
+    cache = get_llm_cache()
+    if cache is None:
+        return get_llm_with_tools()
+    from llm_cache import CachedChatModel
+    llm = get_llm()
+    fingerprint = f"{llm.model_name}|{llm.temperature}|" + ",".join(t.name for t in get_tools())
+    return CachedChatModel(get_llm_with_tools(), cache, fingerprint)
 
 chat_agent_template = """
 You are a helpful assistant designed to guide a user in forming a structured and well-defined ad search request for various platforms using SerpAPI. Your task is to collect all necessary parameters from the user, validate them, and format them correctly for the API call.
@@ -30,4 +89,7 @@ If the user wants to update parameters, allow that before calling the tool.
 
 def get_llm_with_prompt(messages):
     from langchain_core.messages import SystemMessage
-    return [SystemMessage(content=chat_agent_template)] + messages, llm_with_tools
+    from compact import compact_history
+    # Tool results are sent in compact table form; the UI keeps the full text.
+    llm = _llm_override or get_cached_llm_with_tools()
+    return [SystemMessage(content=chat_agent_template)] + compact_history(messages), llm
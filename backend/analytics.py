@@ -0,0 +1,269 @@
+# backend/analytics.py
+"""Incremental trend aggregates over creatives returned by the ad tools.
+
+Every batch is normalised into a small DataFrame, reduced with vectorised
+pandas group-bys and added into running counters keyed by group, so ingest
+cost is proportional to the batch; queries build Series from the (much
+smaller) aggregates rather than the raw creatives.
+
+Creatives are counted once: each is keyed by an engine-specific id
+(`ad_creative_id`, else its landing `link`) and repeats of the same search
+are skipped. Creatives without a run date (all naver/google/youtube ads) are
+counted per advertiser but kept out of the per-day series.
+"""
+import threading
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+COLUMNS = ["engine", "advertiser", "title", "region", "platform", "format", "run_date", "first_shown"]
+
+_WORD_RGX = r"[^\W\d_]{3,}"
+STOPWORDS = frozenset(
+    "the and for with your you our from this that are now get new all more "
+    "best free off shop buy official site online www com http https".split()
+)
+
+# -----------------------------------------------------------------------------
+# Normalisation
+# -----------------------------------------------------------------------------
+
+def _param(params, *names):
+    for name in names:
+        value = getattr(params, name, None) if params is not None else None
+        if value:
+            return value
+    return None
+
+
+def normalize_creative(engine: str, ad: dict, params=None) -> dict:
+    """Map a raw SerpAPI creative onto the common analytics columns."""
+    if engine == "google_ads_transparency_center":
+        advertiser = ad.get("advertiser_name") or ad.get("advertiser")
+        region = ad.get("region") or _param(params, "region")
+        platform = ad.get("platform") or _param(params, "platform")
+        fmt = ad.get("format") or ad.get("creative_format") or _param(params, "creative_format")
+        run_date = ad.get("run_date") or ad.get("first_shown_datetime")
+    elif engine == "naver":
+        advertiser = ad.get("site") or ad.get("displayed_link")
+        region, platform, fmt = "KR", "NAVER", "text"
+        run_date = None
+    elif engine == "google":
+        advertiser = ad.get("advertiser") or ad.get("source") or ad.get("displayed_link")
+        region = _param(params, "gl", "location")
+        platform, fmt = "SEARCH", "text"
+        run_date = None
+    elif engine == "youtube":
+        advertiser = ad.get("channel_name") or (ad.get("channel") or {}).get("name")
+        region = _param(params, "gl")
+        platform, fmt = "YOUTUBE", "video"
+        run_date = None
+    else:
+        advertiser = ad.get("advertiser_name") or ad.get("advertiser")
+        region, platform, fmt = ad.get("region"), ad.get("platform"), ad.get("format")
+        run_date = ad.get("run_date")
+
+    return {
+        "engine": engine,
+        "advertiser": advertiser,
+        "title": ad.get("title"),
+        "region": region,
+        "platform": platform,
+        "format": fmt,
+        "run_date": run_date,
+        "first_shown": ad.get("first_shown"),
+    }
+
+
+def creative_key(engine: str, ad: dict) -> str:
+    """Stable identity of a creative within an engine, for de-duplication."""
+    key = ad.get("ad_creative_id") or ad.get("link")
+    if not key:
+        key = "|".join(str(ad.get(f) or "") for f in ("advertiser_name", "channel_name", "site", "title"))
+    return f"{engine}:{key}"
+
+
+def _to_frame(engine: str, ads: list, params=None) -> pd.DataFrame:
+    df = pd.DataFrame([normalize_creative(engine, a, params) for a in ads], columns=COLUMNS)
+    for col in ("advertiser", "region", "platform", "format"):
+        df[col] = df[col].fillna("unknown").astype(str)
+    df["title"] = df["title"].fillna("").astype(str)
+
+    # run_date is a YYYYMMDD or ISO string; first_shown is epoch seconds.
+    # Rows with neither keep day=NaT and stay out of the per-day series.
+    raw = df["run_date"].astype("string").str.strip()
+    compact = raw.where(raw.str.fullmatch(r"\d{8}", na=False))
+    days = pd.to_datetime(compact, format="%Y%m%d", errors="coerce", utc=True)
+    days = days.fillna(pd.to_datetime(raw.where(compact.isna()), errors="coerce", utc=True, format="mixed"))
+    shown = pd.to_numeric(df["first_shown"], errors="coerce")
+    days = days.fillna(pd.to_datetime(shown, unit="s", errors="coerce", utc=True))
+    df["day"] = days.dt.tz_localize(None).dt.normalize()
+    return df
+
+
+def _series(counts: Counter, names: list) -> pd.Series:
+    if len(names) == 1:
+        index = pd.Index(list(counts), name=names[0])
+    else:
+        index = pd.MultiIndex.from_tuples(list(counts), names=names)
+    return pd.Series(list(counts.values()), index=index, dtype="int64")
+
+
+# -----------------------------------------------------------------------------
+# Aggregates
+# -----------------------------------------------------------------------------
+
+class TrendAnalytics:
+    """Running counts per advertiser/day, region/platform/format and keyword."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clear()
+
+    _INDEX = {
+        "_by_advertiser": ["advertiser"],
+        "_by_advertiser_day": ["advertiser", "day"],
+        "_by_region_mix": ["region", "platform", "format"],
+        "_keywords": ["keyword"],
+    }
+
+    def _clear(self) -> None:
+        self._seen = set()
+        for name in self._INDEX:
+            setattr(self, name, Counter())
+        self.total = 0
+        self.duplicates = 0
+        self.batches = 0
+
+    # Ingest ------------------------------------------------------------------
+
+    def ingest(self, engine: str, ads: list, params=None) -> int:
+        """Fold a batch of raw creatives into the aggregates; returns how many were new."""
+        if not ads:
+            return 0
+        keys = [creative_key(engine, a) for a in ads]
+        with self._lock:
+            fresh = []
+            for key, ad in zip(keys, ads):
+                if key not in self._seen:
+                    self._seen.add(key)
+                    fresh.append(ad)
+            self.duplicates += len(ads) - len(fresh)
+            self.batches += 1
+        if not fresh:
+            return 0
+        df = _to_frame(engine, fresh, params)
+
+        by_adv = df.groupby("advertiser").size()
+        by_adv_day = df.groupby(["advertiser", "day"]).size()   # drops undated rows
+        by_mix = df.groupby(["region", "platform", "format"]).size()
+        words = df["title"].str.lower().str.findall(_WORD_RGX).explode().dropna()
+        keywords = words[~words.isin(STOPWORDS)].value_counts()
+
+        with self._lock:
+            self._by_advertiser.update(by_adv.to_dict())
+            self._by_advertiser_day.update(by_adv_day.to_dict())
+            self._by_region_mix.update(by_mix.to_dict())
+            self._keywords.update(keywords.to_dict())
+            self.total += len(df)
+        return len(df)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._clear()
+
+    # Queries -----------------------------------------------------------------
+
+    def _snapshot(self, name: str) -> pd.Series:
+        with self._lock:
+            counts = Counter(getattr(self, name))
+        return _series(counts, self._INDEX[name])
+
+    def ads_per_advertiser(self, freq: str = "D", top: int | None = 10) -> pd.DataFrame:
+        """Dated creatives per advertiser bucketed by `run_date` (rows=period, cols=advertiser)."""
+        s = self._snapshot("_by_advertiser_day")
+        if s.empty:
+            return pd.DataFrame()
+        df = s.rename("count").reset_index()
+        if top:
+            leaders = df.groupby("advertiser")["count"].sum().nlargest(top).index
+            df = df[df["advertiser"].isin(leaders)]
+        df["period"] = df["day"].dt.to_period(freq).dt.start_time
+        return df.pivot_table(index="period", columns="advertiser", values="count",
+                              aggfunc="sum", fill_value=0).sort_index()
+
+    def _mix(self, level: str, region: str | None, normalize: bool) -> pd.DataFrame:
+        s = self._snapshot("_by_region_mix")
+        if s.empty:
+            return pd.DataFrame()
+        if region is not None:
+            s = s[s.index.get_level_values("region") == region]
+        table = s.groupby(level=["region", level]).sum().unstack(fill_value=0)
+        if normalize:
+            totals = table.to_numpy().sum(axis=1, keepdims=True)
+            table = pd.DataFrame(np.divide(table.to_numpy(), np.maximum(totals, 1)),
+                                 index=table.index, columns=table.columns)
+        return table
+
+    def platform_mix(self, region: str | None = None, normalize: bool = True) -> pd.DataFrame:
+        """Share (or count) of creatives per platform, one row per region."""
+        return self._mix("platform", region, normalize)
+
+    def format_mix(self, region: str | None = None, normalize: bool = True) -> pd.DataFrame:
+        """Share (or count) of creatives per creative format, one row per region."""
+        return self._mix("format", region, normalize)
+
+    def advertiser_totals(self, dated_only: bool = False) -> pd.Series:
+        """Creatives per advertiser, dated or not."""
+        if dated_only:
+            return self._snapshot("_by_advertiser_day").groupby(level="advertiser").sum()
+        return self._snapshot("_by_advertiser")
+
+    def top_keywords(self, n: int = 20) -> pd.Series:
+        s = self._snapshot("_keywords")
+        return s.nlargest(n) if not s.empty else s
+
+    # Presentation ------------------------------------------------------------
+
+    def to_dict(self, freq: str = "W", top: int = 10) -> dict:
+        """JSON-friendly view of every aggregate, for the API layer."""
+        adv = self.ads_per_advertiser(freq=freq, top=top)
+        adv.index = adv.index.strftime("%Y-%m-%d") if not adv.empty else adv.index
+        undated = self.advertiser_totals().sub(self.advertiser_totals(dated_only=True), fill_value=0)
+        undated = undated[undated > 0].astype("int64").nlargest(top)
+        return {
+            "total": self.total,
+            "duplicates": self.duplicates,
+            "batches": self.batches,
+            "ads_per_advertiser": adv.to_dict(orient="index"),
+            "undated_per_advertiser": undated.to_dict(),
+            "platform_mix": self.platform_mix().to_dict(orient="index"),
+            "format_mix": self.format_mix().to_dict(orient="index"),
+            "top_keywords": self.top_keywords(top).to_dict(),
+        }
+
+    def summary_markdown(self, top: int = 5) -> str:
+        """Short markdown digest suitable for the chat UI."""
+        if not self.total:
+            return "No creatives collected yet."
+        leaders = self.advertiser_totals().nlargest(top)
+        lines = [f"**{self.total} creatives** across {self.batches} searches", "", "Top advertisers:"]
+        lines += [f"- {name}: {count}" for name, count in leaders.items()]
+        keywords = self.top_keywords(top)
+        if not keywords.empty:
+            lines += ["", "Top keywords: " + ", ".join(keywords.index)]
+        return "\n".join(lines)
+
+
+_analytics = None
+_analytics_lock = threading.Lock()
+
+
+def get_analytics() -> TrendAnalytics:
+    """Process-wide analytics instance."""
+    global _analytics
+    with _analytics_lock:
+        if _analytics is None:
+            _analytics = TrendAnalytics()
+        return _analytics
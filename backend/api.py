@@ -0,0 +1,187 @@
+# backend/api.py
+import os
+import uuid
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import FileResponse
+from fastapi.middleware.cors import CORSMiddleware
+from pydantic import BaseModel
+
+from analytics import get_analytics
+from tools import add_creative_listener
+from sessions import QuotaExceeded
+from workers import PoolSaturated, get_pool
+
+app = FastAPI(title="TrendMaker API")
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+add_creative_listener(get_analytics().ingest)
+
+# Optionally mirror every creative batch into columnar files for BI pipelines.
+if os.getenv("CREATIVE_EXPORT_DIR"):
+    from export import ExportSink
+
+    _export_sink = add_creative_listener(ExportSink(
+        os.environ["CREATIVE_EXPORT_DIR"],
+        fmt=os.getenv("CREATIVE_EXPORT_FORMAT", "parquet"),
+    ))
+    _export_sink.start_flusher(float(os.getenv("CREATIVE_EXPORT_FLUSH_S", "60")))
+    app.add_event_handler("shutdown", _export_sink.close)
+
+
+class AskRequest(BaseModel):
+    message: str
+    thread_id: str | None = None
+    user_id: str | None = None
+    # Optional {"tool": ..., "args": {...}} to run a search without the LLM.
+    manual_request: dict | None = None
+
+
+class CreativeBatch(BaseModel):
+    engine: str
+    ads: list[dict]
+
+
+# -----------------------------------------------------------------------------
+# Chat
+# -----------------------------------------------------------------------------
+
+@app.post("/ask")
+def ask(req: AskRequest):
+    """Run one conversation turn on the graph worker pool."""
+    from langchain_core.messages import HumanMessage
+
+    thread_id = req.thread_id or str(uuid.uuid4())
+    config = {"configurable": {"thread_id": thread_id, "user_id": req.user_id or thread_id}}
+    try:
+        inputs = {"messages": [HumanMessage(content=req.message)]}
+        if req.manual_request:
+            inputs["manual_request"] = req.manual_request
+        future = get_pool().submit(inputs, config, timeout=5)
+    except PoolSaturated as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+    except QuotaExceeded as exc:
+        raise HTTPException(status_code=429, detail=str(exc))
+
+    try:
+        steps = future.result()
+    except QuotaExceeded as exc:
+        raise HTTPException(status_code=429, detail=str(exc))
+    replies = [m for step in steps for update in step.values() for m in (update or {}).get("messages", [])]
+    return {"thread_id": thread_id, "response": replies[-1].content if replies else ""}
+
+
+@app.get("/workers/metrics")
+def worker_metrics():
+    return get_pool().metrics()
+
+
+@app.get("/sessions/metrics")
+def session_metrics():
+    """Active sessions, evictions and per-tenant SerpAPI/LLM usage."""
+    from sessions import get_session_manager
+    return get_session_manager().metrics()
+
+
+@app.get("/serpapi/metrics")
+def serpapi_metrics():
+    """Per-engine latency percentiles, adaptive timeout and circuit state."""
+    from tools import serpapi_client
+    return serpapi_client.metrics()
+
+
+@app.get("/llm/cache")
+def llm_cache_metrics():
+    from agents import get_llm_cache
+    cache = get_llm_cache()
+    return cache.metrics() if cache is not None else {"enabled": False}
+
+
+# -----------------------------------------------------------------------------
+# Trends
+# -----------------------------------------------------------------------------
+
+@app.post("/trends/ingest")
+def ingest_creatives(batch: CreativeBatch):
+    """Fold an externally collected batch of raw creatives into the aggregates."""
+    return {"ingested": get_analytics().ingest(batch.engine, batch.ads)}
+
+
+@app.get("/trends")
+def trends(freq: str = "W", top: int = 10):
+    return get_analytics().to_dict(freq=freq, top=top)
+
+
+@app.get("/trends/advertisers")
+def trends_advertisers(freq: str = "W", top: int = 10):
+    table = get_analytics().ads_per_advertiser(freq=freq, top=top)
+    if not table.empty:
+        table.index = table.index.strftime("%Y-%m-%d")
+    return table.to_dict(orient="index")
+
+
+@app.get("/trends/mix")
+def trends_mix(region: str | None = None, normalize: bool = True):
+    analytics = get_analytics()
+    return {
+        "platform": analytics.platform_mix(region, normalize).to_dict(orient="index"),
+        "format": analytics.format_mix(region, normalize).to_dict(orient="index"),
+    }
+
+
+@app.get("/trends/keywords")
+def trends_keywords(n: int = 20):
+    return get_analytics().top_keywords(n).to_dict()
+
+
+# -----------------------------------------------------------------------------
+# Media
+# -----------------------------------------------------------------------------
+
+_IMMUTABLE = {"Cache-Control": "public, max-age=31536000, immutable", "X-Content-Type-Options": "nosniff"}
+
+
+@app.get("/media/thumb")
+def media_thumb(url: str):
+    """Thumbnail for a creative image URL; fetched once, then served from disk."""
+    from media import UnsafeURL, check_url, get_media_cache
+    cache = get_media_cache()
+    digest = cache.lookup(url)
+    if digest is None:
+        try:
+            check_url(url)
+        except UnsafeURL as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        digest = cache.fetch(url)
+    path = cache.local_path(digest) if digest else None
+    if path is None:
+        raise HTTPException(status_code=502, detail=f"Could not fetch an image from {url}")
+    return FileResponse(path, media_type="image/jpeg", headers=_IMMUTABLE)
+
+
+@app.get("/media/metrics")
+def media_metrics():
+    from media import get_media_cache
+    return get_media_cache().metrics()
+
+
+@app.get("/media/{digest}")
+def media_object(digest: str, thumb: bool = True):
+    """Content-addressed image (or its thumbnail) by SHA-256 digest."""
+    from media import get_media_cache
+    cache = get_media_cache()
+    if len(digest) != 64 or not all(c in "0123456789abcdef" for c in digest):
+        raise HTTPException(status_code=400, detail="Invalid digest")
+    if thumb:
+        path, media_type = cache.local_path(digest), "image/jpeg"
+    else:
+        # Originals are verified images but of unknown type; never render them inline.
+        path, media_type = cache.object_path(digest), "application/octet-stream"
+    if path is None or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Not cached")
+    return FileResponse(path, media_type=media_type, headers=_IMMUTABLE)
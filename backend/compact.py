@@ -0,0 +1,147 @@
+# backend/compact.py
+"""Token-efficient encoding of tool results for the LLM.
+
+The tools return one markdown block per ad ("Ad 1\\nTitle: ...\\nAdvertiser:
+..."). That text stays in the chat history for the UI, but before history is
+sent to the model each block list is re-encoded as a compact table: fields
+with the same value on every row are factored into a header, empty/N/A
+columns are dropped, URLs lose their scheme and tracking parameters (utm_*,
+gclid, ...; identifying ones such as YouTube's `v=` are kept), long values
+are truncated and duplicate rows are merged.
+
+    python compact.py fixtures/*.md     # token reduction per fixture
+
+fixtures/ holds hand-written samples in the tools' output format (one ad
+per distinct creative), not captured API responses; measure against real
+tool output before quoting numbers.
+"""
+import re
+import sys
+
+MAX_FIELD_CHARS = 60
+_EMPTY = {"", "N/A"}
+_BLOCK_RGX = re.compile(r"^Ad \d+$")
+_URL_PREFIX_RGX = re.compile(r"^https?://(www\.)?")
+# Click/campaign tracking parameters; they never identify the landing page.
+_TRACKING_PARAMS = {"gclid", "gclsrc", "gbraid", "wbraid", "dclid", "fbclid", "msclkid", "yclid",
+                    "igshid", "mc_cid", "mc_eid", "_ga", "_gl", "napm"}
+_TRACKING_PREFIXES = ("utm_", "n_")   # n_*: Naver search-ad tracking
+
+
+def parse_blocks(text: str) -> list[dict] | None:
+    """Parse tool markdown into one dict per ad; None if it is not ad blocks."""
+    records = []
+    for block in text.strip().split("\n\n"):
+        lines = block.strip().splitlines()
+        if not lines or not _BLOCK_RGX.match(lines[0].strip()):
+            return None
+        record = {}
+        for line in lines[1:]:
+            key, sep, value = line.partition(":")
+            if not sep:
+                return None
+            record[key.strip()] = value.strip()
+        records.append(record)
+    return records or None
+
+
+def _is_tracking(param: str) -> bool:
+    return param in _TRACKING_PARAMS or param.startswith(_TRACKING_PREFIXES)
+
+
+def _strip_tracking(url: str) -> str:
+    base, sep, query = url.partition("?")
+    if not sep:
+        return url
+    query, hash_sep, fragment = query.partition("#")
+    # Kept parameters stay verbatim; re-encoding would percent-escape non-ASCII text.
+    kept = [pair for pair in query.split("&")
+            if pair and not _is_tracking(pair.partition("=")[0].lower())]
+    return base + ("?" + "&".join(kept) if kept else "") + hash_sep + fragment
+
+
+def _shorten(key: str, value: str, limit: int) -> str:
+    if "URL" in key or key == "Link":
+        value = _strip_tracking(_URL_PREFIX_RGX.sub("", value))
+    value = value.replace("|", "/")
+    return value if len(value) <= limit else value[: limit - 1] + "…"
+
+
+def encode_records(records: list[dict], limit: int = MAX_FIELD_CHARS) -> str:
+    columns = list(dict.fromkeys(k for r in records for k in r))
+    values = {c: [_shorten(c, r.get(c, ""), limit) for r in records] for c in columns}
+
+    shared, table = [], []
+    for c in columns:
+        distinct = set(values[c])
+        if distinct <= _EMPTY:
+            continue
+        if len(distinct) == 1 and len(records) > 1:
+            shared.append(f"{c}={values[c][0]}")
+        else:
+            table.append(c)
+
+    header = f"{len(records)} ads" + ("; " + "; ".join(shared) if shared else "")
+    if not table:
+        return header
+
+    # Merge identical rows, keeping the ad numbers that produced them.
+    rows = {}
+    for i in range(len(records)):
+        row = tuple("" if values[c][i] in _EMPTY else values[c][i] for c in table)
+        rows.setdefault(row, []).append(str(i + 1))
+    lines = [header, "#|" + "|".join(table)]
+    lines += [",".join(ids) + "|" + "|".join(row) for row, ids in rows.items()]
+    return "\n".join(lines)
+
+
+def compact_tool_output(text: str, limit: int = MAX_FIELD_CHARS) -> str:
+    """Compact form of a tool result, or the text unchanged if it is not ad blocks."""
+    records = parse_blocks(text) if text else None
+    return encode_records(records, limit) if records else text
+
+
+def compact_history(messages: list) -> list:
+    """Copy of `messages` with ToolMessage contents compacted for the model."""
+    compacted = []
+    for m in messages:
+        if m.type == "tool" and isinstance(m.content, str):
+            short = compact_tool_output(m.content)
+            if short != m.content:
+                m = m.model_copy(update={"content": short})
+        compacted.append(m)
+    return compacted
+
+
+# -----------------------------------------------------------------------------
+# Measurement
+# -----------------------------------------------------------------------------
+
+def count_tokens(text: str) -> int:
+    """cl100k token count when tiktoken is installed, else a chars/4 estimate."""
+    try:
+        import tiktoken
+    except ImportError:
+        return max(1, len(text) // 4)
+    return len(tiktoken.get_encoding("cl100k_base").encode(text))
+
+
+def measure(paths: list[str]) -> list[dict]:
+    rows = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+        before, after = count_tokens(text), count_tokens(compact_tool_output(text))
+        rows.append({"fixture": path, "before": before, "after": after,
+                     "reduction": 1 - after / before if before else 0.0})
+    return rows
+
+
+if __name__ == "__main__":
+    import glob
+    import os
+
+    paths = sys.argv[1:] or sorted(glob.glob(os.path.join(os.path.dirname(__file__), "fixtures", "*.md")))
+    print(f"{'fixture':<48} {'before':>7} {'after':>7} {'saved':>7}")
+    for r in measure(paths):
+        print(f"{os.path.basename(r['fixture']):<48} {r['before']:>7} {r['after']:>7} {r['reduction']:>7.1%}")
@@ -0,0 +1,337 @@
+# backend/export.py
+"""Stream creatives into Parquet, Arrow IPC or CSV files.
+
+Rows are buffered up to `chunk_size` and flushed as one row group / record
+batch / CSV block, so memory stays bounded however many creatives pass
+through. Every engine has a fixed column schema; unknown fields are dropped
+and nested values are stored as JSON strings.
+
+    python export.py snapshot.jsonl --out exports/ --format parquet
+"""
+import csv
+import gzip
+import json
+import os
+import sys
+import threading
+import time
+
+# Columns shared by every engine, followed by the engine's own fields.
+META_COLUMNS = [("engine", "string"), ("fetched_at", "timestamp")]
+
+ENGINE_SCHEMAS = {
+    "google_ads_transparency_center": [
+        ("advertiser_id", "string"),
+        ("advertiser_name", "string"),
+        ("ad_creative_id", "string"),
+        ("format", "string"),
+        ("title", "string"),
+        ("region", "string"),
+        ("platform", "string"),
+        ("run_date", "string"),
+        ("first_shown", "int"),
+        ("last_shown", "int"),
+        ("total_days_shown", "int"),
+        ("target_domain", "string"),
+        ("link", "string"),
+        ("image", "string"),
+        ("width", "int"),
+        ("height", "int"),
+        ("details_link", "string"),
+    ],
+    "naver": [
+        ("position", "int"),
+        ("title", "string"),
+        ("description", "string"),
+        ("site", "string"),
+        ("link", "string"),
+        ("displayed_link", "string"),
+    ],
+    "google": [
+        ("position", "int"),
+        ("block_position", "string"),
+        ("title", "string"),
+        ("description", "string"),
+        ("source", "string"),
+        ("displayed_link", "string"),
+        ("link", "string"),
+        ("tracking_link", "string"),
+    ],
+    "youtube": [
+        ("position", "int"),
+        ("title", "string"),
+        ("channel_name", "string"),
+        ("description", "string"),
+        ("link", "string"),
+        ("thumbnail", "string"),
+    ],
+}
+
+FORMATS = ("parquet", "arrow", "csv")
+
+# Codecs each writer accepts (None = the format's default).
+COMPRESSIONS = {
+    "parquet": (None, "none", "snappy", "gzip", "brotli", "zstd", "lz4"),
+    "arrow": (None, "lz4", "zstd"),
+    "csv": (None, "gzip"),
+}
+
+
+def columns_for(engine: str) -> list:
+    if engine not in ENGINE_SCHEMAS:
+        raise ValueError(f"No export schema for engine: {engine}")
+    return META_COLUMNS + ENGINE_SCHEMAS[engine]
+
+
+def _coerce(value, kind):
+    if value is None or value == "":
+        return None
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    if kind == "int":
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+    return str(value)
+
+
+def to_row(engine: str, ad: dict, fetched_at: int | None = None) -> dict:
+    """Project a raw creative onto the engine's export columns."""
+    row = {"engine": engine, "fetched_at": fetched_at if fetched_at is not None else int(time.time() * 1000)}
+    for name, kind in ENGINE_SCHEMAS[engine]:
+        row[name] = _coerce(ad.get(name), kind)
+    if engine == "youtube" and row["channel_name"] is None:
+        row["channel_name"] = _coerce((ad.get("channel") or {}).get("name"), "string")
+    return row
+
+
+def _arrow_schema(engine: str):
+    import pyarrow as pa
+    types = {"string": pa.string(), "int": pa.int64(), "timestamp": pa.timestamp("ms", tz="UTC")}
+    return pa.schema([(name, types[kind]) for name, kind in columns_for(engine)])
+
+
+# -----------------------------------------------------------------------------
+# Writers
+# -----------------------------------------------------------------------------
+
+class CreativeExporter:
+    """Chunked writer for one engine's creatives.
+
+    `append=True` adds to existing output: CSV files are extended in place,
+    while Parquet/Arrow (which cannot be appended to) are written as a
+    directory of part files that readers load as one dataset.
+
+    Not thread-safe; `ExportSink` serializes access for concurrent callers.
+    """
+
+    def __init__(self, path: str, engine: str, fmt: str = "parquet", compression: str | None = None,
+                 append: bool = False, chunk_size: int = 10_000):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown export format: {fmt} (expected one of {', '.join(FORMATS)})")
+        if compression not in COMPRESSIONS[fmt]:
+            allowed = ", ".join(c for c in COMPRESSIONS[fmt] if c)
+            raise ValueError(f"Unsupported compression for {fmt}: {compression} (expected one of {allowed})")
+        self.engine = engine
+        self.fmt = fmt
+        self.columns = [name for name, _ in columns_for(engine)]
+        self.compression = compression
+        self.append = append
+        self.chunk_size = chunk_size
+        self.rows_written = 0
+        self._buffer = []
+        self._writer = None
+        self._file = None
+        self.path = self._resolve_path(path)
+
+    def _resolve_path(self, path: str) -> str:
+        if self.fmt == "csv" or not self.append:
+            return path
+        os.makedirs(path, exist_ok=True)
+        existing = [f for f in os.listdir(path) if f.startswith("part-")]
+        return os.path.join(path, f"part-{len(existing):05d}.{self.fmt}")
+
+    # Public API ----------------------------------------------------------------
+
+    def write(self, ads, fetched_at: int | None = None) -> None:
+        for ad in ads:
+            self._buffer.append(to_row(self.engine, ad, fetched_at))
+            if len(self._buffer) >= self.chunk_size:
+                self.flush()
+
+    def flush(self) -> None:
+        if not self._buffer:
+            return
+        if self.fmt == "csv":
+            self._flush_csv()
+        else:
+            self._flush_arrow()
+        self.rows_written += len(self._buffer)
+        self._buffer = []
+
+    def close(self) -> None:
+        self.flush()
+        if self._writer is not None and self.fmt != "csv":
+            self._writer.close()
+        if self._file is not None:
+            self._file.close()
+        self._writer = self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # Format specifics ----------------------------------------------------------
+
+    def _flush_csv(self) -> None:
+        if self._file is None:
+            new_file = not (self.append and os.path.exists(self.path) and os.path.getsize(self.path))
+            mode = "at" if self.append else "wt"
+            if self.compression == "gzip" or self.path.endswith(".gz"):
+                self._file = gzip.open(self.path, mode, newline="", encoding="utf-8")
+            else:
+                self._file = open(self.path, mode, newline="", encoding="utf-8")
+            self._writer = csv.DictWriter(self._file, fieldnames=self.columns)
+            if new_file:
+                self._writer.writeheader()
+        self._writer.writerows(self._buffer)
+
+    def _flush_arrow(self) -> None:
+        import pyarrow as pa
+
+        schema = _arrow_schema(self.engine)
+        batch = pa.RecordBatch.from_pylist(self._buffer, schema=schema)
+        if self._writer is None:
+            if self.fmt == "parquet":
+                import pyarrow.parquet as pq
+                self._writer = pq.ParquetWriter(self.path, schema, compression=self.compression or "snappy")
+            else:
+                import pyarrow.ipc as ipc
+                options = ipc.IpcWriteOptions(compression=self.compression) if self.compression else None
+                self._writer = ipc.new_file(self.path, schema, options=options)
+        if self.fmt == "arrow":
+            self._writer.write_batch(batch)
+        else:
+            self._writer.write_table(pa.Table.from_batches([batch]))
+
+
+class ExportSink:
+    """Creative listener (see `tools.add_creative_listener`) writing one file per engine.
+
+    Safe to call from several threads. In a long-running process, call
+    `start_flusher` so open files are rolled periodically: each roll closes the
+    current part files (Parquet/Arrow get their footer) and the next batch
+    starts a new part, so a crash loses at most one interval of rows.
+    """
+
+    def __init__(self, directory: str, fmt: str = "parquet", **options):
+        self.directory = directory
+        self.fmt = fmt
+        self.options = {"append": True, **options}
+        self._exporters = {}
+        self._lock = threading.Lock()
+        self._flusher = None
+        self.rows_written = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def __call__(self, engine, ads, params=None) -> None:
+        if engine not in ENGINE_SCHEMAS:
+            return
+        with self._lock:
+            if engine not in self._exporters:
+                path = os.path.join(self.directory, f"{engine}.{self.fmt}")
+                self._exporters[engine] = CreativeExporter(path, engine, self.fmt, **self.options)
+            self._exporters[engine].write(ads)
+
+    def roll(self) -> dict:
+        """Close the current files; the next batch per engine opens a new part."""
+        with self._lock:
+            for engine, exporter in self._exporters.items():
+                exporter.close()
+                self.rows_written[engine] = self.rows_written.get(engine, 0) + exporter.rows_written
+            self._exporters.clear()
+            return dict(self.rows_written)
+
+    def start_flusher(self, interval: float = 60.0) -> None:
+        """Roll files every `interval` seconds on a daemon thread."""
+        if not self.options["append"]:
+            raise ValueError("Rolling export files requires append=True")
+        if self._flusher is not None:
+            return
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                self.roll()
+
+        self._flusher = threading.Thread(target=loop, daemon=True, name="export-flusher")
+        self._flusher.start()
+
+    def close(self) -> dict:
+        """Flush and close every file; returns rows written per engine."""
+        return self.roll()
+
+
+# -----------------------------------------------------------------------------
+# Snapshots
+# -----------------------------------------------------------------------------
+
+RESULT_KEYS = {
+    "google_ads_transparency_center": ("ad_creatives",),
+    "naver": ("ads_results",),
+    "google": ("ads",),
+    "youtube": ("ads_results", "top_ads"),
+}
+
+
+def iter_snapshot(path: str):
+    """Yield (engine, ads) from a JSON-lines file of raw SerpAPI responses.
+
+    Each line is either a full response (engine read from `search_parameters`)
+    or an `{"engine": ..., "ads": [...]}` batch. Lines are read one at a time.
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if "ads" in record and "engine" in record:
+                yield record["engine"], record["ads"]
+                continue
+            engine = (record.get("search_parameters") or {}).get("engine")
+            for key in RESULT_KEYS.get(engine, ()):
+                if record.get(key):
+                    yield engine, record[key]
+                    break
+
+
+def export_batches(batches, directory: str, fmt: str = "parquet", **options) -> dict:
+    """Write an iterable of (engine, ads) into per-engine files; returns row counts."""
+    sink = ExportSink(directory, fmt, **options)
+    try:
+        for engine, ads in batches:
+            sink(engine, ads)
+    finally:
+        counts = sink.close()
+    return counts
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export a creative snapshot to columnar files")
+    parser.add_argument("snapshot", help="JSON-lines file of SerpAPI responses or {engine, ads} batches")
+    parser.add_argument("--out", default="exports")
+    parser.add_argument("--format", choices=FORMATS, default="parquet")
+    parser.add_argument("--compression", default=None)
+    parser.add_argument("--append", action="store_true")
+    parser.add_argument("--chunk-size", type=int, default=10_000)
+    args = parser.parse_args()
+
+    counts = export_batches(iter_snapshot(args.snapshot), args.out, args.format,
+                            compression=args.compression, append=args.append, chunk_size=args.chunk_size)
+    json.dump(counts, sys.stdout, indent=2)
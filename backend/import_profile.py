@@ -0,0 +1,81 @@
+# backend/import_profile.py
+"""Import-time profiling report for the backend modules.
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter and
+summarises the slowest imports, so startup regressions show up in review/CI:
+
+    python import_profile.py states --top 15 --budget-ms 300
+    python import_profile.py states agents tools --forbid streamlit
+
+Exits non-zero when a module exceeds `--budget-ms` or pulls in a `--forbid`den
+package.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+
+def profile_import(module: str) -> list[dict]:
+    """Return one entry per imported module with self/cumulative time in ms."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr.strip()[-2000:]}")
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        rows.append({
+            "module": name.strip(),
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000,
+        })
+    return rows
+
+
+def report(module: str, rows: list[dict], top: int) -> str:
+    total = next((r["cumulative_ms"] for r in rows if r["module"] == module), 0.0)
+    lines = [f"import {module}: {total:.1f} ms, {len(rows)} modules", "",
+             f"{'cumulative ms':>14} {'self ms':>9}  module"]
+    for r in sorted(rows, key=lambda r: r["cumulative_ms"], reverse=True)[:top]:
+        lines.append(f"{r['cumulative_ms']:>14.1f} {r['self_ms']:>9.1f}  {r['module']}")
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("modules", nargs="*", default=["states"])
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="fail if any module's cumulative import time exceeds this")
+    parser.add_argument("--forbid", action="append", default=[],
+                        help="top-level package that must not be imported (repeatable)")
+    args = parser.parse_args(argv)
+
+    failures = []
+    for module in args.modules:
+        rows = profile_import(module)
+        print(report(module, rows, args.top), end="\n\n")
+
+        total = next((r["cumulative_ms"] for r in rows if r["module"] == module), 0.0)
+        if args.budget_ms is not None and total > args.budget_ms:
+            failures.append(f"{module}: {total:.1f} ms exceeds budget of {args.budget_ms:.1f} ms")
+        imported = {r["module"].split(".")[0] for r in rows}
+        for pkg in args.forbid:
+            if pkg in imported:
+                failures.append(f"{module}: imports forbidden package '{pkg}'")
+
+    for failure in failures:
+        print(f"FAIL {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+# backend/llm_cache.py
+"""Exact-match response cache in front of the tool-bound chat model.
+
+The model runs at temperature 0, so an identical system prompt + history
+yields the same reply. Keys are a hash of the system prompt, a model
+fingerprint and the normalised (ids stripped, whitespace collapsed) history.
+Entries live in a local SQLite file with a TTL and an LRU size cap. The
+cache fails open: a SQLite error (e.g. "database is locked" when several
+worker processes share the file) is counted and the model is called as if
+the entry were missing.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize_message(m) -> dict:
+    content = m.content if isinstance(m.content, str) else json.dumps(m.content, sort_keys=True)
+    item = {"type": m.type, "content": " ".join(content.split())}
+    if getattr(m, "tool_calls", None):
+        item["tool_calls"] = [{"name": c["name"], "args": c["args"]} for c in m.tool_calls]
+    return item
+
+
+def cache_key(messages: list, fingerprint: str = "") -> str:
+    """Hash of system prompt + fingerprint + normalised conversation."""
+    system = [m for m in messages if m.type == "system"]
+    history = [_normalize_message(m) for m in messages if m.type != "system"]
+    digest = hashlib.sha256()
+    digest.update(hashlib.sha256("\n".join(m.content for m in system).encode()).digest())
+    digest.update(fingerprint.encode())
+    digest.update(json.dumps(history, sort_keys=True, ensure_ascii=False, default=str).encode())
+    return digest.hexdigest()
+
+
+class LLMResponseCache:
+    """SQLite-backed TTL/LRU store of serialised model replies."""
+
+    def __init__(self, path: str, ttl: float = 24 * 3600, max_entries: int = 5000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, message TEXT, latency REAL, created REAL, accessed REAL)"
+        )
+        self._db.commit()
+        self.stats = {"hits": 0, "misses": 0, "errors": 0, "latency_saved": 0.0}
+
+    def get(self, key: str):
+        """Return (message_dict, original_latency) or None."""
+        now = time.time()
+        # `with self._db` commits, or rolls back so a failed write holds no lock.
+        with self._lock, self._db:
+            row = self._db.execute(
+                "SELECT message, latency, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[2] > self.ttl:
+                if row is not None:
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.stats["misses"] += 1
+                return None
+            self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self.stats["hits"] += 1
+            self.stats["latency_saved"] += row[1]
+            return json.loads(row[0]), row[1]
+
+    def put(self, key: str, message: dict, latency: float) -> None:
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (key, json.dumps(message), latency, now, now),
+            )
+            self._db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+            self._db.execute(
+                "DELETE FROM responses WHERE key IN ("
+                " SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+
+    def record_error(self, exc: Exception) -> None:
+        with self._lock:
+            self.stats["errors"] += 1
+        logger.warning("LLM response cache unavailable: %s", exc)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            try:
+                size = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            except sqlite3.Error:
+                size = None
+            stats = dict(self.stats)
+        lookups = stats["hits"] + stats["misses"]
+        return {
+            **stats,
+            "entries": size,
+            "hit_rate": stats["hits"] / lookups if lookups else 0.0,
+        }
+
+
+class CachedChatModel:
+    """Wraps a runnable chat model; `invoke` consults the cache first."""
+
+    def __init__(self, llm, cache: LLMResponseCache, fingerprint: str = ""):
+        self.llm = llm
+        self.cache = cache
+        self.fingerprint = fingerprint
+
+    def invoke(self, messages, *args, **kwargs):
+        from langchain_core.messages import messages_from_dict, message_to_dict
+
+        key = cache_key(messages, self.fingerprint)
+        try:
+            hit = self.cache.get(key)
+        except sqlite3.Error as exc:
+            self.cache.record_error(exc)
+            hit = None
+        if hit is not None:
+            message = messages_from_dict([hit[0]])[0]
+            # Fresh ids so add_messages does not merge the reply into an earlier one.
+            message.id = None
+            message.usage_metadata = None  # served from cache: no tokens spent
+            message.response_metadata = {**message.response_metadata, "served_from": "cache"}
+            for call in getattr(message, "tool_calls", None) or []:
+                call["id"] = f"call_{uuid.uuid4().hex[:24]}"
+            return message
+
+        started = time.perf_counter()
+        response = self.llm.invoke(messages, *args, **kwargs)
+        try:
+            self.cache.put(key, message_to_dict(response), time.perf_counter() - started)
+        except sqlite3.Error as exc:
+            self.cache.record_error(exc)
+        return response
+
+
+def default_cache() -> LLMResponseCache | None:
+    """Cache configured from LLM_CACHE_* env vars, or None when disabled."""
+    if os.getenv("LLM_CACHE_DISABLED", "").lower() in ("1", "true", "yes"):
+        return None
+    path = os.getenv("LLM_CACHE_PATH") or os.path.join(os.path.dirname(__file__), ".llm_cache.sqlite3")
+    return LLMResponseCache(
+        path,
+        ttl=float(os.getenv("LLM_CACHE_TTL", 24 * 3600)),
+        max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", 5000)),
+    )
@@ -0,0 +1,319 @@
+# backend/media.py
+"""Creative image fetcher with a content-addressed on-disk cache.
+
+Images are stored once under their SHA-256 digest (`objects/ab/abcdef…`),
+with a small JPEG thumbnail generated alongside on first fetch. A SQLite
+index maps source URLs to digests and tracks access times so the cache can
+be trimmed LRU-first to `max_bytes`. Once a URL is cached, serving it (or its
+thumbnail) needs no network I/O. Failed or rejected URLs are remembered too,
+for `failure_ttl` seconds, so a page that re-renders does not refetch them.
+
+URLs come from ad results, i.e. third parties, so fetching is restricted:
+http(s) only, public addresses only (checked after DNS resolution and again
+on every redirect), an `image/*` content type and a size cap. The connection
+goes to the exact address that was checked, with the original Host header
+and TLS server name, so a DNS answer that changes between check and connect
+(rebinding) cannot redirect the fetch to an internal address. Only images
+that Pillow can decode are cached, and only their re-encoded thumbnails are
+served, so a non-image response is never handed back to a client.
+"""
+import hashlib
+import io
+import ipaddress
+import os
+import socket
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlparse
+
+import certifi
+import urllib3
+
+THUMB_SIZE = (320, 320)
+MAX_REDIRECTS = 3
+
+
+class UnsafeURL(ValueError):
+    """Raised for URLs the media cache refuses to fetch."""
+
+
+class _FetchFailed(Exception):
+    """Transport or HTTP error while fetching an allowed URL."""
+
+
+def resolve_public(url: str):
+    """Return (parsed url, address to connect to) for a fetchable URL.
+
+    Raises `UnsafeURL` unless `url` is http(s) and its host resolves only to
+    public addresses.
+    """
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise UnsafeURL(f"Only http(s) URLs can be fetched: {url}")
+    try:
+        infos = socket.getaddrinfo(parsed.hostname, parsed.port or parsed.scheme, proto=socket.IPPROTO_TCP)
+    except (socket.gaierror, UnicodeError) as exc:
+        raise UnsafeURL(f"Cannot resolve {parsed.hostname}: {exc}") from None
+    if not infos:
+        raise UnsafeURL(f"Cannot resolve {parsed.hostname}")
+    for info in infos:
+        ip = ipaddress.ip_address(info[4][0].split("%", 1)[0])
+        if getattr(ip, "ipv4_mapped", None):
+            ip = ip.ipv4_mapped
+        if (ip.is_private or ip.is_loopback or ip.is_link_local or ip.is_multicast
+                or ip.is_reserved or ip.is_unspecified or not ip.is_global):
+            raise UnsafeURL(f"{parsed.hostname} resolves to a non-public address ({ip})")
+    return parsed, infos[0][4][0]
+
+
+def check_url(url: str) -> None:
+    """Raise `UnsafeURL` unless `url` is http(s) and resolves only to public addresses."""
+    resolve_public(url)
+
+
+class MediaCache:
+    def __init__(self, root: str, max_bytes: int = 512 * 1024 * 1024, workers: int = 8,
+                 thumb_size: tuple = THUMB_SIZE, timeout: float = 10,
+                 max_object_bytes: int = 10 * 1024 * 1024, failure_ttl: float = 600):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_object_bytes = max_object_bytes
+        self.thumb_size = thumb_size
+        self.timeout = timeout
+        self.failure_ttl = failure_ttl
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="media-fetch")
+        self._lock = threading.Lock()
+        self._inflight = {}
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        os.makedirs(os.path.join(root, "thumbs"), exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(root, "index.sqlite3"), check_same_thread=False)
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS urls (url TEXT PRIMARY KEY, digest TEXT);"
+            "CREATE TABLE IF NOT EXISTS blobs (digest TEXT PRIMARY KEY, size INTEGER, accessed REAL);"
+            "CREATE TABLE IF NOT EXISTS failures (url TEXT PRIMARY KEY, failed REAL);"
+        )
+        self._db.commit()
+        self.stats = {"hits": 0, "fetched": 0, "errors": 0, "rejected": 0, "evicted": 0, "failure_hits": 0}
+
+    # Paths ---------------------------------------------------------------------
+
+    def object_path(self, digest: str) -> str:
+        return os.path.join(self.root, "objects", digest[:2], digest)
+
+    def thumb_path(self, digest: str) -> str:
+        return os.path.join(self.root, "thumbs", f"{digest}.jpg")
+
+    # Lookup --------------------------------------------------------------------
+
+    def lookup(self, url: str) -> str | None:
+        """Digest for an already-cached URL (touching its LRU entry), else None."""
+        with self._lock:
+            row = self._db.execute("SELECT digest FROM urls WHERE url = ?", (url,)).fetchone()
+            if row is None or not os.path.exists(self.object_path(row[0])):
+                return None
+            self._db.execute("UPDATE blobs SET accessed = ? WHERE digest = ?", (time.time(), row[0]))
+            self._db.commit()
+            self.stats["hits"] += 1
+            return row[0]
+
+    def get(self, url: str) -> str | None:
+        """Digest for `url`, fetching it if needed; None if the download fails."""
+        return self.lookup(url) or self.fetch(url)
+
+    def fetch(self, url: str) -> str | None:
+        """Download `url` (skipping the `lookup`); None if it fails or failed recently."""
+        future = self._submit(url)
+        return future.result() if future is not None else None
+
+    def fetch_many(self, urls) -> dict:
+        """Fetch uncached URLs concurrently; returns {url: digest or None}."""
+        futures = {}
+        result = {}
+        for url in dict.fromkeys(urls):
+            digest = self.lookup(url)
+            if digest:
+                result[url] = digest
+            else:
+                futures[url] = self._submit(url)
+        for url, future in futures.items():
+            result[url] = future.result() if future is not None else None
+        return result
+
+    def local_path(self, digest: str) -> str | None:
+        """Thumbnail path for a cached digest; None if there is none.
+
+        Never falls back to the original bytes: the thumbnail is re-encoded
+        by Pillow, so it is guaranteed to be a JPEG.
+        """
+        thumb = self.thumb_path(digest)
+        return thumb if os.path.exists(thumb) else None
+
+    def thumbnail(self, url: str) -> str | None:
+        digest = self.get(url)
+        return self.local_path(digest) if digest else None
+
+    def thumbnails(self, urls) -> dict:
+        """{url: local path} for every URL that could be fetched."""
+        paths = {url: self.local_path(d) for url, d in self.fetch_many(urls).items() if d}
+        return {url: path for url, path in paths.items() if path}
+
+    # Fetch ---------------------------------------------------------------------
+
+    def _submit(self, url: str):
+        # Single-flight: concurrent requests for one URL share a download.
+        # Returns None while a recent failure for `url` is still remembered.
+        with self._lock:
+            row = self._db.execute("SELECT failed FROM failures WHERE url = ?", (url,)).fetchone()
+            if row is not None and time.time() - row[0] < self.failure_ttl:
+                self.stats["failure_hits"] += 1
+                return None
+            future = self._inflight.get(url)
+            if future is None:
+                future = self._inflight[url] = self._pool.submit(self._download, url)
+                future.add_done_callback(lambda _f, u=url: self._inflight.pop(u, None))
+            return future
+
+    def _open(self, parsed, address: str):
+        """GET `parsed` from `address` without resolving its host again."""
+        options = {"timeout": urllib3.Timeout(connect=self.timeout, read=self.timeout), "retries": False,
+                   "maxsize": 1}
+        if parsed.scheme == "https":
+            pool = urllib3.HTTPSConnectionPool(
+                address, parsed.port or 443, server_hostname=parsed.hostname,
+                assert_hostname=parsed.hostname, cert_reqs="CERT_REQUIRED", ca_certs=certifi.where(), **options)
+        else:
+            pool = urllib3.HTTPConnectionPool(address, parsed.port or 80, **options)
+        target = (parsed.path or "/") + (f"?{parsed.query}" if parsed.query else "")
+        host = parsed.hostname if ":" not in parsed.hostname else f"[{parsed.hostname}]"
+        headers = {"Host": host + (f":{parsed.port}" if parsed.port else ""), "Accept": "image/*"}
+        return pool.urlopen("GET", target, headers=headers, redirect=False, preload_content=False,
+                            assert_same_host=False)
+
+    def _fetch(self, url: str) -> bytes:
+        """GET an image, re-checking every redirect hop; raises UnsafeURL or _FetchFailed."""
+        for _ in range(MAX_REDIRECTS + 1):
+            parsed, address = resolve_public(url)
+            try:
+                r = self._open(parsed, address)
+            except (urllib3.exceptions.HTTPError, OSError) as exc:
+                raise _FetchFailed(f"{url}: {exc}") from exc
+            try:
+                if r.status in (301, 302, 303, 307, 308) and r.headers.get("Location"):
+                    url = urljoin(url, r.headers["Location"])
+                    continue
+                if r.status >= 400:
+                    raise _FetchFailed(f"{url}: HTTP {r.status}")
+                content_type = r.headers.get("Content-Type", "").split(";", 1)[0].strip().lower()
+                if not content_type.startswith("image/"):
+                    raise UnsafeURL(f"Not an image ({content_type or 'no content type'}): {url}")
+                if int(r.headers.get("Content-Length") or 0) > self.max_object_bytes:
+                    raise UnsafeURL(f"Image larger than {self.max_object_bytes} bytes: {url}")
+                data = bytearray()
+                try:
+                    for chunk in r.stream(64 * 1024):
+                        data += chunk
+                        if len(data) > self.max_object_bytes:
+                            raise UnsafeURL(f"Image larger than {self.max_object_bytes} bytes: {url}")
+                except (urllib3.exceptions.HTTPError, OSError) as exc:
+                    raise _FetchFailed(f"{url}: {exc}") from exc
+                return bytes(data)
+            finally:
+                r.release_conn()
+        raise UnsafeURL(f"Too many redirects: {url}")
+
+    def _download(self, url: str) -> str | None:
+        try:
+            data = self._fetch(url)
+        except (UnsafeURL, _FetchFailed) as exc:
+            self._record_failure(url, "rejected" if isinstance(exc, UnsafeURL) else "errors")
+            return None
+
+        digest = hashlib.sha256(data).hexdigest()
+        path, thumb = self.object_path(digest), self.thumb_path(digest)
+        if not os.path.exists(thumb):
+            # Only bytes Pillow can decode are kept.
+            if not self._make_thumbnail(data, thumb):
+                self._record_failure(url, "rejected")
+                return None
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+
+        size = len(data) + os.path.getsize(thumb)
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO urls VALUES (?, ?)", (url, digest))
+            self._db.execute("INSERT OR REPLACE INTO blobs VALUES (?, ?, ?)", (digest, size, time.time()))
+            self._db.execute("DELETE FROM failures WHERE url = ?", (url,))
+            self._db.commit()
+            self.stats["fetched"] += 1
+            self._evict_locked()
+        return digest
+
+    def _record_failure(self, url: str, stat: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO failures VALUES (?, ?)", (url, now))
+            self._db.execute("DELETE FROM failures WHERE failed < ?", (now - self.failure_ttl,))
+            self._db.commit()
+            self.stats[stat] += 1
+
+    def _make_thumbnail(self, data: bytes, path: str) -> bool:
+        """Write a JPEG thumbnail; False if `data` is not a decodable image."""
+        from PIL import Image
+
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with Image.open(io.BytesIO(data)) as img:
+                img.thumbnail(self.thumb_size)
+                img.convert("RGB").save(tmp, "JPEG", quality=80, optimize=True)
+        except (OSError, ValueError, Image.DecompressionBombError):
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return False
+        os.replace(tmp, path)
+        return True
+
+    # Eviction ------------------------------------------------------------------
+
+    def _evict_locked(self) -> None:
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for digest, size in self._db.execute("SELECT digest, size FROM blobs ORDER BY accessed").fetchall():
+            if total <= self.max_bytes:
+                break
+            for path in (self.object_path(digest), self.thumb_path(digest)):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._db.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+            self._db.execute("DELETE FROM urls WHERE digest = ?", (digest,))
+            total -= size
+            self.stats["evicted"] += 1
+        self._db.commit()
+
+    def metrics(self) -> dict:
+        with self._lock:
+            count, total = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+            return {**self.stats, "objects": count, "bytes": total, "max_bytes": self.max_bytes}
+
+
+_media_cache = None
+_media_lock = threading.Lock()
+
+
+def get_media_cache() -> MediaCache:
+    """Process-wide cache configured from MEDIA_CACHE_DIR / MEDIA_CACHE_MAX_MB / MEDIA_FAILURE_TTL_S."""
+    global _media_cache
+    with _media_lock:
+        if _media_cache is None:
+            _media_cache = MediaCache(
+                os.getenv("MEDIA_CACHE_DIR") or os.path.join(os.path.dirname(__file__), ".media_cache"),
+                max_bytes=int(os.getenv("MEDIA_CACHE_MAX_MB", "512")) * 1024 * 1024,
+                failure_ttl=float(os.getenv("MEDIA_FAILURE_TTL_S", "600")),
+            )
+        return _media_cache
@@ -0,0 +1,404 @@
+# backend/replay.py
+"""Record conversations and replay them as load against the graph.
+
+Recording: with RECORD_SESSIONS=recordings.jsonl every turn run through the
+session manager (inputs + the LLM's replies) and every SerpAPI call (query +
+response) is appended as one JSON line per event, with API keys scrubbed.
+
+Replay: recorded threads are re-run by a pool of virtual users arriving at a
+given rate. Turns go through a `SessionManager` (and optionally a
+`GraphWorkerPool`), as they do in production, so quotas, the memory cap and
+checkpoint re-seeding are part of the measurement. The chat model is replaced by a stub
+returning each thread's recorded replies, and SerpAPI by a local HTTP server
+serving the recorded responses, so a run costs no API calls.
+
+    python replay.py recordings.jsonl --concurrency 8 --rate 4 --repeat 10
+"""
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+_SECRET_RGX = re.compile(r"(api_key=)[^&\s\"']+|\bsk-[A-Za-z0-9_-]{16,}")
+
+
+def scrub(text: str) -> str:
+    """Mask SerpAPI keys in URLs and OpenAI-style secret keys."""
+    return _SECRET_RGX.sub(lambda m: (m.group(1) or "") + "***", text)
+
+
+def _query_key(query: dict) -> str:
+    return json.dumps({k: str(v) for k, v in query.items() if k != "api_key"}, sort_keys=True)
+
+
+# -----------------------------------------------------------------------------
+# Recording
+# -----------------------------------------------------------------------------
+
+class Recorder:
+    """Appends turn and SerpAPI events to a JSON-lines file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _write(self, record: dict) -> None:
+        line = scrub(json.dumps(record, ensure_ascii=False, default=str))
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def record_turn(self, thread_id: str, inputs: dict, steps: list) -> None:
+        from langchain_core.messages import messages_to_dict
+
+        replies = [m for step in steps for node, update in step.items()
+                   if node == "collect_user_input" for m in (update or {}).get("messages", [])]
+        self._write({
+            "type": "turn",
+            "thread_id": thread_id,
+            "ts": time.time(),
+            "messages": messages_to_dict(inputs.get("messages", [])),
+            "manual_request": inputs.get("manual_request"),
+            "llm_replies": messages_to_dict(replies),
+        })
+
+    def record_serpapi(self, query: dict, status: int, body) -> None:
+        from sessions import current_thread
+
+        self._write({
+            "type": "serpapi",
+            "thread_id": current_thread.get(),
+            "ts": time.time(),
+            "query": {k: v for k, v in query.items() if k != "api_key"},
+            "status": status,
+            "body": body,
+        })
+
+    def attach(self, manager) -> "Recorder":
+        """Start capturing turns from `manager` and calls from the tools."""
+        import tools
+        manager.recorder = self
+        tools.serpapi_recorder = self.record_serpapi
+        return self
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+def load_recording(path: str):
+    """Return ({thread_id: [turn, ...]}, {query_key: body}) from a recording."""
+    threads = defaultdict(list)
+    responses = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            event = json.loads(line)
+            if event["type"] == "turn":
+                threads[event["thread_id"]].append(event)
+            elif event["type"] == "serpapi" and event.get("body") is not None:
+                responses[_query_key(event["query"])] = event["body"]
+    return dict(threads), responses
+
+
+# -----------------------------------------------------------------------------
+# Stand-ins
+# -----------------------------------------------------------------------------
+
+# thread_id -> recorded replies still to serve. Keyed by the session's thread
+# (sessions.current_thread) rather than a context variable, because with a
+# worker pool the turn runs on a pool thread, not the virtual user's.
+_replay_replies: dict = {}
+
+FALLBACK_REPLY = "Shall I proceed to search with these parameters?"
+
+
+class ReplayLLM:
+    """Chat-model stub returning the current virtual user's recorded replies in order."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+
+    def invoke(self, messages, *args, **kwargs):
+        from langchain_core.messages import AIMessage, messages_from_dict
+        from sessions import current_thread
+
+        if self.latency:
+            time.sleep(self.latency)
+        replies = _replay_replies.get(current_thread.get())
+        if not replies:
+            return AIMessage(content=FALLBACK_REPLY, response_metadata={"served_from": "replay"})
+        message = messages_from_dict([replies.popleft()])[0]
+        message.id = None
+        message.usage_metadata = None
+        message.response_metadata = {**message.response_metadata, "served_from": "replay"}
+        for call in getattr(message, "tool_calls", None) or []:
+            call["id"] = f"call_{uuid.uuid4().hex[:24]}"
+        return message
+
+
+class StubSerpAPI:
+    """Local HTTP server answering SerpAPI queries from recorded responses.
+
+    Unknown queries get the first recorded response for the same engine, or
+    an empty result set.
+    """
+
+    def __init__(self, responses: dict, latency: float = 0.0):
+        self.responses = responses
+        self.latency = latency
+        self.by_engine = {}
+        for key, body in responses.items():
+            self.by_engine.setdefault(json.loads(key).get("engine"), body)
+        self._server = None
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                query = dict(parse_qsl(urlparse(self.path).query))
+                body = stub.responses.get(_query_key(query)) or stub.by_engine.get(query.get("engine"), {})
+                if stub.latency:
+                    time.sleep(stub.latency)
+                payload = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> str:
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        threading.Thread(target=self._server.serve_forever, daemon=True, name="serpapi-stub").start()
+        return f"http://127.0.0.1:{self._server.server_address[1]}/search"
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+# -----------------------------------------------------------------------------
+# Load generation
+# -----------------------------------------------------------------------------
+
+def _percentiles(values: list) -> dict:
+    if not values:
+        return {"count": 0}
+    values = sorted(values)
+
+    def pick(p):
+        return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+    return {"count": len(values), "p50": pick(50), "p95": pick(95), "p99": pick(99), "max": values[-1]}
+
+
+def _rss_kb() -> int | None:
+    """Current resident set size; None where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") // 1024
+
+
+def _peak_rss_kb() -> int | None:
+    try:
+        import resource
+    except ImportError:  # not available on Windows
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class _TimedGraph:
+    """Graph proxy recording how long each node's step took while streaming."""
+
+    def __init__(self, graph, on_step):
+        self._graph = graph
+        self._on_step = on_step
+
+    def stream(self, *args, **kwargs):
+        last = time.perf_counter()
+        for step in self._graph.stream(*args, **kwargs):
+            now = time.perf_counter()
+            self._on_step(next(iter(step)), now - last)
+            last = now
+            yield step
+
+    def __getattr__(self, name):
+        return getattr(self._graph, name)
+
+
+def run_load(threads: dict, concurrency: int = 4, rate: float | None = None, repeat: int = 1,
+             graph_getter=None, seed: int = 0, pool_workers: int | None = None) -> dict:
+    """Replay every recorded thread `repeat` times and report latency/throughput.
+
+    Virtual users arrive as a Poisson process at `rate` per second (all at
+    once when None); at most `concurrency` run at a time. Each replays its
+    thread's turns in order on a fresh thread_id, through a private
+    `SessionManager`, and with `pool_workers` set through a thread-mode
+    `GraphWorkerPool` of that size.
+
+    Arrival times are fixed up front, so a saturated pool does not slow the
+    arrivals down (coordinated omission). `response_time_s` is measured from
+    when a turn should have started (the user's scheduled arrival, or the end
+    of its previous turn), `queue_delay_s` is the wait before a user got a
+    worker, and `turn_latency_s` is the session manager's service time
+    (including pool queueing when `pool_workers` is set).
+    """
+    from langchain_core.messages import messages_from_dict
+    from sessions import SessionManager
+    from workers import GraphWorkerPool
+
+    if graph_getter is None:
+        from states import get_graph as graph_getter
+
+    lock = threading.Lock()
+    turn_latency = []
+    response_time = []
+    queue_delay = []
+    node_latency = defaultdict(list)
+    errors = []
+
+    def on_step(node, seconds):
+        with lock:
+            node_latency[node].append(seconds)
+
+    graph = _TimedGraph(graph_getter(), on_step)
+    manager = SessionManager(graph_getter=lambda: graph)
+    pool = None
+    if pool_workers:
+        pool = GraphWorkerPool(
+            workers=pool_workers, max_pending=max(concurrency, pool_workers),
+            runner=lambda inputs, config: manager.run_turn(config["configurable"]["user_id"], inputs, config),
+        )
+
+    def run_turn(inputs, config):
+        if pool is not None:
+            return pool.run(inputs, config)
+        return manager.run_turn(config["configurable"]["user_id"], inputs, config)
+
+    def virtual_user(turns, scheduled):
+        due = scheduled
+        with lock:
+            queue_delay.append(time.perf_counter() - scheduled)
+        thread_id = f"replay-{uuid.uuid4()}"
+        config = {"configurable": {"thread_id": thread_id, "user_id": thread_id}}
+        _replay_replies[thread_id] = deque(r for turn in turns for r in turn["llm_replies"])
+        try:
+            for turn in turns:
+                inputs = {"messages": messages_from_dict(turn["messages"])}
+                if turn.get("manual_request"):
+                    inputs["manual_request"] = turn["manual_request"]
+                started = time.perf_counter()
+                try:
+                    run_turn(inputs, config)
+                except Exception as exc:
+                    with lock:
+                        errors.append(repr(exc))
+                    return
+                finished = time.perf_counter()
+                with lock:
+                    turn_latency.append(finished - started)
+                    response_time.append(finished - due)
+                due = finished
+        finally:
+            _replay_replies.pop(thread_id, None)
+
+    users = [turns for _ in range(repeat) for turns in threads.values()]
+    rng = random.Random(seed)
+    offsets, at = [], 0.0
+    for _ in users:
+        offsets.append(at)
+        if rate:
+            at += rng.expovariate(rate)
+    rss_before = _rss_kb()
+    started = time.perf_counter()
+    futures = []
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="replay") as executor:
+            for turns, offset in zip(users, offsets):
+                scheduled = started + offset
+                # Sleep to the absolute arrival time so submission overhead does not drift the schedule.
+                time.sleep(max(0.0, scheduled - time.perf_counter()))
+                futures.append(executor.submit(virtual_user, turns, scheduled))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    elapsed = time.perf_counter() - started
+    rss_after = _rss_kb()
+    for future in futures:
+        # A virtual user that failed outside a turn (e.g. a malformed recording).
+        if future.exception() is not None:
+            errors.append(repr(future.exception()))
+
+    return {
+        "virtual_users": len(users),
+        "turns": len(turn_latency),
+        "errors": len(errors),
+        "error_samples": errors[:5],
+        "elapsed_s": elapsed,
+        "throughput_turns_per_s": len(turn_latency) / elapsed if elapsed else 0.0,
+        "response_time_s": _percentiles(response_time),
+        "queue_delay_s": _percentiles(queue_delay),
+        "turn_latency_s": _percentiles(turn_latency),
+        "node_latency_s": {node: _percentiles(v) for node, v in node_latency.items()},
+        "evicted_messages": manager.metrics()["evicted_messages"],
+        "rss_kb_before": rss_before,
+        "rss_kb_after": rss_after,
+        "rss_growth_kb": rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+        "max_rss_kb": _peak_rss_kb(),
+    }
+
+
+def replay(path: str, concurrency: int = 4, rate: float | None = None, repeat: int = 1,
+           llm_latency: float = 0.0, serpapi_latency: float = 0.0, pool_workers: int | None = None) -> dict:
+    """Load a recording, install the stubs and run the load test."""
+    import agents
+    import tools
+
+    threads, responses = load_recording(path)
+    stub = StubSerpAPI(responses, latency=serpapi_latency)
+    real_url = tools.SERPAPI_URL
+    tools.SERPAPI_URL = stub.start()
+    agents.override_llm(ReplayLLM(latency=llm_latency))
+    try:
+        return run_load(threads, concurrency=concurrency, rate=rate, repeat=repeat, pool_workers=pool_workers)
+    finally:
+        agents.override_llm(None)
+        tools.SERPAPI_URL = real_url
+        stub.stop()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Replay recorded conversations as load against the graph")
+    parser.add_argument("recording")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=None, help="virtual-user arrivals per second")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="simulated model latency (s)")
+    parser.add_argument("--serpapi-latency", type=float, default=0.0, help="simulated SerpAPI latency (s)")
+    parser.add_argument("--pool-workers", type=int, default=None, help="run turns through a worker pool")
+    args = parser.parse_args()
+
+    os.environ.setdefault("SERPAPI_API_KEY", "replay")
+    print(json.dumps(replay(args.recording, args.concurrency, args.rate, args.repeat,
+                            args.llm_latency, args.serpapi_latency, args.pool_workers), indent=2))
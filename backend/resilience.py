@@ -0,0 +1,235 @@
+# backend/resilience.py
+"""Per-engine latency tracking, adaptive timeouts, hedging and circuit breaking.
+
+Each SerpAPI engine keeps a rolling window of request latencies; a timed-out
+request counts as a sample at its timeout, so repeated timeouts widen the
+timeout instead of pinning it at the floor. The request timeout follows the
+observed p99 (with headroom, clamped to [min_timeout, max_timeout]); with
+hedging enabled a second identical request is fired once the first has been
+running (not merely queued) past p95, and whichever answers first wins.
+Engines that fail repeatedly are short-circuited for a cooldown period.
+"""
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+
+
+class CircuitOpen(RuntimeError):
+    """Raised instead of calling an engine whose breaker is open."""
+
+
+class LatencyTracker:
+    """Rolling window of latencies (seconds) with percentile queries."""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, p: float) -> float | None:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(p / 100 * len(samples)))]
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive failures; half-opens after `cooldown`."""
+
+    def __init__(self, threshold: int = 5, cooldown: float = 30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "half_open":
+                # Let one probe through; re-arm the cooldown until it reports back.
+                self.opened_at = time.monotonic()
+                return True
+            return state == "closed"
+
+    def success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+class EngineClient:
+    """`requests.get` wrapper applying per-engine adaptive timeouts and breakers.
+
+    `on_send(engine)` is called once for every HTTP request actually sent,
+    hedged duplicates included, in the caller's context.
+    """
+
+    def __init__(self, min_timeout: float = 3.0, max_timeout: float = 30.0, headroom: float = 1.5,
+                 min_samples: int = 20, hedge: bool = False, breaker_threshold: int = 5,
+                 breaker_cooldown: float = 30.0, workers: int = 16, on_send=None):
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.headroom = headroom
+        self.min_samples = min_samples
+        self.hedge = hedge
+        self.on_send = on_send
+        self._breaker_args = (breaker_threshold, breaker_cooldown)
+        self._latency = {}
+        self._breakers = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="serpapi")
+
+    def _engine(self, engine: str):
+        with self._lock:
+            if engine not in self._latency:
+                self._latency[engine] = LatencyTracker()
+                self._breakers[engine] = CircuitBreaker(*self._breaker_args)
+                self._stats[engine] = {"requests": 0, "sent": 0, "errors": 0, "timeouts": 0,
+                                       "hedged": 0, "hedge_wins": 0, "short_circuited": 0}
+            return self._latency[engine], self._breakers[engine], self._stats[engine]
+
+    def _bump(self, stats: dict, *keys) -> None:
+        with self._lock:
+            for key in keys:
+                stats[key] += 1
+
+    def timeout_for(self, engine: str) -> float:
+        latency, _, _ = self._engine(engine)
+        p99 = latency.percentile(99)
+        if p99 is None or len(latency) < self.min_samples:
+            return self.max_timeout
+        return min(self.max_timeout, max(self.min_timeout, p99 * self.headroom))
+
+    def hedge_delay(self, engine: str) -> float | None:
+        latency, _, _ = self._engine(engine)
+        if not self.hedge or len(latency) < self.min_samples:
+            return None
+        return latency.percentile(95)
+
+    # Requests ------------------------------------------------------------------
+
+    def _timed_get(self, engine, url, params, timeout, started_event=None):
+        if started_event is not None:
+            started_event.set()
+        self._bump(self._engine(engine)[2], "sent")
+        if self.on_send is not None:
+            self.on_send(engine)
+        started = time.monotonic()
+        r = requests.get(url, params=params, timeout=timeout)
+        return r, time.monotonic() - started
+
+    def get(self, engine: str, url: str, params: dict) -> requests.Response:
+        """GET with the engine's timeout/hedging policy.
+
+        Raises `CircuitOpen` when the engine is short-circuited and
+        `requests.RequestException` on transport errors/timeouts.
+        """
+        latency, breaker, stats = self._engine(engine)
+        if not breaker.allow():
+            self._bump(stats, "short_circuited")
+            raise CircuitOpen(f"{engine} is failing; retry in {breaker.cooldown:.0f}s")
+
+        self._bump(stats, "requests")
+        timeout = self.timeout_for(engine)
+        delay = self.hedge_delay(engine)
+        try:
+            if delay is None:
+                r, elapsed = self._timed_get(engine, url, params, timeout)
+            else:
+                r, elapsed = self._hedged_get(engine, url, params, timeout, delay, stats)
+        except requests.Timeout:
+            self._bump(stats, "timeouts", "errors")
+            breaker.failure()
+            # Censored sample: the real latency is at least the timeout.
+            latency.record(timeout)
+            raise
+        except requests.RequestException:
+            self._bump(stats, "errors")
+            breaker.failure()
+            raise
+
+        if r.status_code >= 500 or r.status_code == 429:
+            self._bump(stats, "errors")
+            breaker.failure()
+        else:
+            breaker.success()
+            latency.record(elapsed)
+        return r
+
+    def _submit(self, *args):
+        # Fresh context copy per task, so on_send sees the caller's contextvars.
+        return self._pool.submit(contextvars.copy_context().run, self._timed_get, *args)
+
+    def _hedged_get(self, engine, url, params, timeout, delay, stats):
+        running = threading.Event()
+        primary = self._submit(engine, url, params, timeout, running)
+        # Time spent queued behind other requests is not slowness of the engine,
+        # and a backup submitted now would only queue behind the primary.
+        running.wait()
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        self._bump(stats, "hedged")
+        backup = self._submit(engine, url, params, max(timeout - delay, self.min_timeout))
+        pending = {primary, backup}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    r, elapsed = future.result()
+                except requests.RequestException as exc:
+                    error = exc
+                    continue
+                if future is backup:
+                    self._bump(stats, "hedge_wins")
+                    elapsed += delay
+                return r, elapsed
+        raise error
+
+    # Metrics -------------------------------------------------------------------
+
+    def metrics(self) -> dict:
+        with self._lock:
+            engines = list(self._latency)
+        report = {}
+        for engine in engines:
+            latency, breaker, stats = self._engine(engine)
+            with self._lock:
+                counters = dict(stats)
+            report[engine] = {
+                **counters,
+                "samples": len(latency),
+                "p50": latency.percentile(50),
+                "p95": latency.percentile(95),
+                "p99": latency.percentile(99),
+                "timeout": self.timeout_for(engine),
+                "circuit": breaker.state,
+            }
+        return report
@@ -1,7 +1,18 @@
 # backend/schemas.py
+import json
+import os
+from functools import lru_cache
 from pydantic import BaseModel, Field
 from typing import Optional
 
+
+@lru_cache(maxsize=None)
+def country_to_code() -> dict:
+    """Country name → region code, read once from country_codes.json next to this module."""
+    with open(os.path.join(os.path.dirname(__file__), "country_codes.json")) as f:
+        return {v: k for k, v in json.load(f).items()}
+
+
 class GoogleAdTransparencyParameters(BaseModel):
     advertiser_id: Optional[str] = Field(None)
     text: Optional[str] = Field(None)
@@ -0,0 +1,217 @@
+# backend/sessions.py
+"""Multi-tenant session manager around the compiled graph.
+
+- per-user concurrency limit (extra turns are rejected with `QuotaExceeded`)
+- per-session memory cap: once a thread's state grows past `max_session_chars`,
+  the oldest tool outputs are replaced by a short placeholder, and after every
+  turn the thread is re-seeded from its latest state so the checkpointer keeps
+  one checkpoint per thread instead of one per step
+- idle sessions are reaped (checkpoints deleted) after `idle_ttl` seconds
+- per-tenant SerpAPI / LLM usage is accounted via `record_usage`, which tools
+  and nodes call while a turn runs under `current_tenant`
+"""
+import os
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+
+current_tenant: ContextVar[str | None] = ContextVar("current_tenant", default=None)
+current_thread: ContextVar[str | None] = ContextVar("current_thread", default=None)
+
+_EVICTED_PREFIX = "[Earlier ad results removed"
+EVICTED_PLACEHOLDER = _EVICTED_PREFIX + " to save memory ({chars} chars).]"
+
+
+class QuotaExceeded(RuntimeError):
+    """Raised when a user already has the maximum number of turns in flight."""
+
+
+def record_usage(kind: str, amount: int = 1) -> None:
+    """Charge `amount` of `kind` (e.g. "serpapi_calls") to the tenant running this turn."""
+    tenant = current_tenant.get()
+    if tenant is not None:
+        get_session_manager().add_usage(tenant, kind, amount)
+
+
+def _message_chars(m) -> int:
+    content = m.content if isinstance(m.content, str) else str(m.content)
+    return len(content) + sum(len(str(c.get("args", ""))) for c in getattr(m, "tool_calls", None) or [])
+
+
+def evict_tool_outputs(messages: list, max_chars: int) -> tuple[list, int, int]:
+    """Cap a message list at roughly `max_chars`.
+
+    Oldest tool outputs are replaced by a placeholder first; the latest one is
+    always kept. Returns (messages, number evicted, remaining chars).
+    """
+    total = sum(_message_chars(m) for m in messages)
+    last_tool = max((i for i, m in enumerate(messages) if m.type == "tool"), default=-1)
+    capped, evicted = [], 0
+    for i, m in enumerate(messages):
+        if (total > max_chars and m.type == "tool" and i != last_tool
+                and isinstance(m.content, str) and not m.content.startswith(_EVICTED_PREFIX)):
+            placeholder = EVICTED_PLACEHOLDER.format(chars=len(m.content))
+            total -= len(m.content) - len(placeholder)
+            m = m.model_copy(update={"content": placeholder})
+            evicted += 1
+        capped.append(m)
+    return capped, evicted, total
+
+
+class SessionManager:
+    # Node whose update ends a run (its only edge goes to END); re-seeded
+    # threads are written as if it had just run, so the next turn starts fresh.
+    RESEED_AS_NODE = "finalize_tool_run"
+
+    def __init__(self, graph_getter=None, max_concurrent_per_user: int = 2,
+                 max_session_chars: int = 200_000, idle_ttl: float = 3600):
+        if graph_getter is None:
+            from states import get_graph as graph_getter
+        self._graph_getter = graph_getter
+        self.max_concurrent_per_user = max_concurrent_per_user
+        self.max_session_chars = max_session_chars
+        self.idle_ttl = idle_ttl
+        self._lock = threading.Lock()
+        self._inflight = defaultdict(int)
+        self._sessions = {}   # thread_id -> {"user": ..., "last_active": ..., "chars": ...}
+        self._usage = defaultdict(lambda: defaultdict(int))
+        self._stats = {"turns": 0, "rejected": 0, "evicted_messages": 0, "reaped_sessions": 0}
+        self._reaper = None
+        self.recorder = None   # replay.Recorder capturing turns, if enabled
+
+    # Usage ---------------------------------------------------------------------
+
+    def add_usage(self, tenant: str, kind: str, amount: int = 1) -> None:
+        with self._lock:
+            self._usage[tenant][kind] += amount
+
+    # Turns ---------------------------------------------------------------------
+
+    def run_turn(self, user_id: str, inputs: dict, config: dict) -> list:
+        """Run one graph turn for `user_id`; returns the step updates."""
+        thread_id = config["configurable"]["thread_id"]
+        with self._lock:
+            if self._inflight[user_id] >= self.max_concurrent_per_user:
+                self._stats["rejected"] += 1
+                raise QuotaExceeded(
+                    f"User {user_id} already has {self.max_concurrent_per_user} requests in progress"
+                )
+            self._inflight[user_id] += 1
+            self._stats["turns"] += 1
+            self._sessions.setdefault(thread_id, {"user": user_id, "chars": 0})["last_active"] = time.time()
+
+        token = current_tenant.set(user_id)
+        thread_token = current_thread.set(thread_id)
+        try:
+            steps = list(self._graph_getter().stream(inputs, config=config, stream_mode="updates"))
+            if self.recorder is not None:
+                self.recorder.record_turn(thread_id, inputs, steps)
+            self._enforce_memory_cap(config)
+            return steps
+        finally:
+            current_thread.reset(thread_token)
+            current_tenant.reset(token)
+            with self._lock:
+                self._inflight[user_id] -= 1
+                if not self._inflight[user_id]:
+                    del self._inflight[user_id]
+                if thread_id in self._sessions:
+                    self._sessions[thread_id]["last_active"] = time.time()
+
+    def _enforce_memory_cap(self, config: dict) -> None:
+        graph = self._graph_getter()
+        thread_id = config["configurable"]["thread_id"]
+        snapshot = graph.get_state(config)
+        current = snapshot.values.get("messages", [])
+        messages, evicted, total = evict_tool_outputs(current, self.max_session_chars)
+
+        # The checkpointer keeps every step's checkpoint (and a full copy of the
+        # message list per version), so replacing messages alone frees nothing.
+        # Drop the thread and write its current state back as one checkpoint.
+        delete_thread = getattr(getattr(graph, "checkpointer", None), "delete_thread", None)
+        if messages and delete_thread is not None and not snapshot.next:
+            delete_thread(thread_id)
+            graph.update_state(config, {**snapshot.values, "messages": messages}, as_node=self.RESEED_AS_NODE)
+        elif evicted:
+            # add_messages replaces messages with matching ids in place.
+            graph.update_state(config, {"messages": [m for m, old in zip(messages, current) if m is not old]})
+        with self._lock:
+            self._stats["evicted_messages"] += evicted
+            session = self._sessions.get(thread_id)
+            if session is not None:
+                session["chars"] = total
+
+    # Reaping -------------------------------------------------------------------
+
+    def reap_idle(self) -> list:
+        """Delete checkpoints of sessions idle for longer than `idle_ttl`."""
+        cutoff = time.time() - self.idle_ttl
+        with self._lock:
+            idle = [t for t, s in self._sessions.items() if s["last_active"] < cutoff]
+            for thread_id in idle:
+                del self._sessions[thread_id]
+            self._stats["reaped_sessions"] += len(idle)
+
+        checkpointer = getattr(self._graph_getter(), "checkpointer", None)
+        delete_thread = getattr(checkpointer, "delete_thread", None)
+        if delete_thread is not None:
+            for thread_id in idle:
+                delete_thread(thread_id)
+        return idle
+
+    def start_reaper(self, interval: float = 60.0) -> None:
+        """Reap idle sessions every `interval` seconds on a daemon thread."""
+        if self._reaper is not None:
+            return
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                self.reap_idle()
+
+        self._reaper = threading.Thread(target=loop, daemon=True, name="session-reaper")
+        self._reaper.start()
+
+    # Metrics -------------------------------------------------------------------
+
+    def metrics(self) -> dict:
+        with self._lock:
+            per_user = defaultdict(lambda: {"sessions": 0, "chars": 0})
+            for s in self._sessions.values():
+                per_user[s["user"]]["sessions"] += 1
+                per_user[s["user"]]["chars"] += s["chars"]
+            return {
+                **self._stats,
+                "active_sessions": len(self._sessions),
+                "inflight": dict(self._inflight),
+                "tenants": {
+                    user: {**per_user.get(user, {"sessions": 0, "chars": 0}), **self._usage.get(user, {})}
+                    for user in set(per_user) | set(self._usage)
+                },
+            }
+
+
+def session_max_chars() -> int:
+    return int(os.getenv("SESSION_MAX_CHARS", "200000"))
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_session_manager() -> SessionManager:
+    """Process-wide manager configured from SESSION_* env vars."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = SessionManager(
+                max_concurrent_per_user=int(os.getenv("SESSION_MAX_CONCURRENT", "2")),
+                max_session_chars=session_max_chars(),
+                idle_ttl=float(os.getenv("SESSION_IDLE_TTL", "3600")),
+            )
+            _manager.start_reaper()
+            if os.getenv("RECORD_SESSIONS"):
+                from replay import Recorder
+                Recorder(os.environ["RECORD_SESSIONS"]).attach(_manager)
+        return _manager
@@ -1,7 +1,10 @@
 import re
 import streamlit as st
 from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
-from states import graph
+from states import TOOL_NAME_BY_UI
+from sessions import evict_tool_outputs, get_session_manager, session_max_chars
+from analytics import get_analytics
+from tools import add_creative_listener
 
 
 # ─────────────────────── Session‑state initialisation ────────────────────────
@@ -20,26 +23,34 @@ def init_session_state() -> None:
 
 # ───────────────────────── LangGraph interaction helpers ──────────────────────
 
-def _stream_graph() -> None:
-    """Run LangGraph streaming updates and extend chat history."""
-    for step in graph.stream(
-        {"messages": st.session_state["history"]},
-        config=st.session_state["config"],
-        stream_mode="updates",
-    ):
+def _stream_graph(manual_request: dict | None = None) -> None:
+    """Run one graph turn for the latest message and extend chat history."""
+    from states import get_graph
+
+    config = st.session_state["config"]
+    history = st.session_state["history"]
+    # Earlier turns live in the graph checkpoint and only the new message is
+    # sent, unless the session reaper has deleted it: then resend everything.
+    checkpointed = get_graph().get_state(config).values.get("messages")
+    inputs = {"messages": history[-1:] if checkpointed else list(history)}
+    if manual_request:
+        inputs["manual_request"] = manual_request
+    for step in get_session_manager().run_turn(config["configurable"]["thread_id"], inputs, config):
         step_data = next(iter(step.values()))
         if st.session_state.get("show_debug"):
             with st.expander("🔧 Debug Step", expanded=False):
                 st.json(step_data)
         if "messages" in step_data:
             st.session_state["history"].extend(step_data["messages"])
+    # Same cap as the graph checkpoint, so the Streamlit session does not grow unbounded.
+    st.session_state["history"], _, _ = evict_tool_outputs(st.session_state["history"], session_max_chars())
 
 
-def handle_user_input(user_input: str | None) -> None:
+def handle_user_input(user_input: str | None, manual_request: dict | None = None) -> None:
     """Push a HumanMessage (may be blank), run the graph, and gather replies."""
     st.session_state["history"].append(HumanMessage(content=user_input or ""))
     with st.spinner("🤖 Thinking …"):
-        _stream_graph()
+        _stream_graph(manual_request)
 
 
 # ───────────────────────────── Rendering helpers ──────────────────────────────
@@ -67,9 +78,13 @@ def _render_text_or_images(text: str) -> None:
     # First, display the markdown (this also renders images if written in markdown)
     st.markdown(text)
 
-    # Additionally, detect bare image URLs and embed them explicitly
-    for url in _IMG_RGX.findall(text):
-        st.image(url, use_column_width=True)
+    # Additionally, detect bare image URLs and embed cached thumbnails
+    urls = _IMG_RGX.findall(text)
+    if urls:
+        from media import get_media_cache
+        thumbs = get_media_cache().thumbnails(urls)
+        for url in urls:
+            st.image(thumbs.get(url, url), use_column_width=True)
 
 
 def display_chat_history() -> None:
@@ -92,6 +107,7 @@ def main() -> None:
     st.set_page_config(page_title="Ad Search Assistant", page_icon="🔍", layout="wide")
     st.title("🔍 Ad Search Assistant")
     init_session_state()
+    add_creative_listener(get_analytics().ingest)
 
     left, right = st.columns([1, 3])
 
@@ -99,14 +115,21 @@ def main() -> None:
         from manual_ui import render_manual_input
         render_manual_input()
         st.checkbox("Show debug steps", key="show_debug")
+        with st.expander("📈 Trends", expanded=False):
+            st.markdown(get_analytics().summary_markdown())
         if st.session_state.get("manual_status"):
             st.markdown(st.session_state["manual_status"])
 
     if st.session_state.get("manual_trigger"):
-        manual_data = st.session_state.get("manual_input", {})
+        st.session_state["manual_trigger"] = False
+        manual_data = st.session_state.pop("manual_input", {})
         param_summary = "\n".join(f"{k}: {v}" for k, v in manual_data.items() if v)
         summary_msg = f"Manual input submitted:\n{param_summary}"
-        handle_user_input(summary_msg)
+        tool_name = TOOL_NAME_BY_UI.get(
+            st.session_state.get("tool_selection", "Google Ads Transparency"),
+            "google_ad_transparency",
+        )
+        handle_user_input(summary_msg, {"tool": tool_name, "args": manual_data})
         _maybe_rerun()
 
     with right:
@@ -1,24 +1,14 @@
+import threading
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
-from langgraph.checkpoint.memory import MemorySaver
-from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.messages import AIMessage, ToolMessage
 from typing_extensions import TypedDict, Annotated
-from agents import get_llm_with_prompt
-from schemas import (
-    GoogleAdTransparencyParameters,
-    NaverAdSearchParameters,
-    GoogleAdSearchParameters,
-    YouTubeAdSearchParameters
-)
-from tools import (
-    google_ad_transparency,
-    serpapi_naver_ad_search,
-    google_ads_search,
-    youtube_ads_search
-)
-import json
 import uuid
-import streamlit as st
+
+# The LLM client (langchain_openai), the tools and the pydantic schemas are
+# imported inside the functions that need them, and the graph is compiled on
+# first `get_graph()`. langgraph itself is not deferred: `add_messages` lives
+# in the `langgraph.graph` package, whose __init__ loads StateGraph anyway.
 
 # -----------------------------------------------------------------------------
 # Utility helpers
@@ -41,9 +31,6 @@ def _filter_orphan_tool_msgs(msgs: list) -> list:
 # Constants
 # -----------------------------------------------------------------------------
 
-with open("country_codes.json") as f:
-    COUNTRY_TO_CODE = {v: k for k, v in json.load(f).items()}
-
 TOOL_NAME_BY_UI = {
     "Google Ads Transparency": "google_ad_transparency",
     "Google Ad Results": "google_ads_search",
@@ -56,9 +43,16 @@ TOOL_NAME_BY_UI = {
 # Typed state
 # -----------------------------------------------------------------------------
 
-class State(TypedDict):
+class ManualRequest(TypedDict):
+    """Parameters submitted directly from a form, bypassing the LLM."""
+    tool: str   # tool name or UI label, e.g. "google_ad_transparency"
+    args: dict
+
+
+class State(TypedDict, total=False):
     messages: Annotated[list, add_messages]
     tool_call: dict | None
+    manual_request: ManualRequest | None
 
 
 # -----------------------------------------------------------------------------
@@ -69,31 +63,40 @@ def collect_user_input_node(state: State):
     """Handle manual‑input shortcut or route conversation to the LLM."""
 
     # Manual input ----------------------------------------------------------
-    if st.session_state.get("manual_trigger"):
-        manual_data = st.session_state.pop("manual_input", {})
-        st.session_state["manual_trigger"] = False
-
-        tool_name = TOOL_NAME_BY_UI.get(
-            st.session_state.get("tool_selection", "Google Ads Transparency"),
-            "google_ad_transparency",
-        )
+    manual = state.get("manual_request")
+    if manual:
+        tool = manual.get("tool") or "google_ad_transparency"
+        tool_name = TOOL_NAME_BY_UI.get(tool, tool)
+        manual_data = dict(manual.get("args") or {})
 
         # Region name → code for Google Transparency
-        if tool_name == "google_ad_transparency" and manual_data.get("region") in COUNTRY_TO_CODE:
-            manual_data["region"] = COUNTRY_TO_CODE[manual_data["region"]]
+        from schemas import country_to_code
+        if tool_name == "google_ad_transparency" and manual_data.get("region") in country_to_code():
+            manual_data["region"] = country_to_code()[manual_data["region"]]
 
         return {
+            "manual_request": None,
             "tool_call": {
                 "name": tool_name,
                 "args": manual_data,
                 "id": str(uuid.uuid4()),
-            }
+            },
         }
 
     # Conversational route ---------------------------------------------------
+    from agents import get_llm_with_prompt
+    from sessions import record_usage
     cleaned_history = _filter_orphan_tool_msgs(state["messages"])
     messages, llm = get_llm_with_prompt(cleaned_history)
     response = llm.invoke(messages)
+    # Cached and replayed replies are tagged by their source; only real model calls count.
+    served_from = (getattr(response, "response_metadata", None) or {}).get("served_from")
+    if served_from:
+        record_usage(f"llm_{served_from}_hits")
+    else:
+        record_usage("llm_calls")
+        if getattr(response, "usage_metadata", None):
+            record_usage("llm_tokens", response.usage_metadata.get("total_tokens", 0))
     return {"messages": [response]}
 
 
@@ -110,8 +113,9 @@ def format_api_params_node(state: State):
     raw_params = tool_call["args"].copy()
 
     if tool_call["name"] == "google_ad_transparency" and "region" in raw_params:
+        from schemas import country_to_code
         region = raw_params["region"]
-        code = COUNTRY_TO_CODE.get(region)
+        code = country_to_code().get(region)
         if not code:
             return {"messages": [AIMessage(content=f"Invalid region name: {region}. Please provide a valid country.")]}
         raw_params["region"] = code
@@ -120,6 +124,19 @@ def format_api_params_node(state: State):
 
 
 def finalize_tool_run_node(state: State):
+    from schemas import (
+        GoogleAdTransparencyParameters,
+        NaverAdSearchParameters,
+        GoogleAdSearchParameters,
+        YouTubeAdSearchParameters
+    )
+    from tools import (
+        google_ad_transparency,
+        serpapi_naver_ad_search,
+        google_ads_search,
+        youtube_ads_search
+    )
+
     tool_call = state["tool_call"]
     name = tool_call["name"]
 
@@ -142,30 +159,51 @@ def finalize_tool_run_node(state: State):
     else:
         result = f"Unknown tool: {name}"
 
-    return {"messages": [ToolMessage(content=result, tool_call_id=tool_call["id"])]}
+    # Clear the consumed call so it is not replayed from the checkpoint next turn.
+    return {"messages": [ToolMessage(content=result, tool_call_id=tool_call["id"])], "tool_call": None}
 
 
 # -----------------------------------------------------------------------------
 # Graph wiring
 # -----------------------------------------------------------------------------
 
-memory = MemorySaver()
-workflow = StateGraph(State)
-workflow.add_node("collect_user_input", collect_user_input_node)
-workflow.add_node("execute_tool_call", execute_tool_call_node)
-workflow.add_node("format_api_params", format_api_params_node)
-workflow.add_node("finalize_tool_run", finalize_tool_run_node)
-
-workflow.add_edge(START, "collect_user_input")
-workflow.add_conditional_edges(
-    "collect_user_input",
-    lambda s: "format_api_params" if s.get("tool_call") else (
-        "execute_tool_call" if isinstance(s["messages"][-1], AIMessage) and s["messages"][-1].tool_calls else "collect_user_input"
-    ),
-    ["execute_tool_call", "format_api_params", "collect_user_input"],
-)
-workflow.add_edge("execute_tool_call", "format_api_params")
-workflow.add_edge("format_api_params", "finalize_tool_run")
-workflow.add_edge("finalize_tool_run", END)
-
-graph = workflow.compile(checkpointer=memory)
+def _build_graph():
+    from langgraph.checkpoint.memory import MemorySaver
+
+    memory = MemorySaver()
+    workflow = StateGraph(State)
+    workflow.add_node("collect_user_input", collect_user_input_node)
+    workflow.add_node("execute_tool_call", execute_tool_call_node)
+    workflow.add_node("format_api_params", format_api_params_node)
+    workflow.add_node("finalize_tool_run", finalize_tool_run_node)
+
+    workflow.add_edge(START, "collect_user_input")
+    workflow.add_conditional_edges(
+        "collect_user_input",
+        lambda s: "format_api_params" if s.get("tool_call") else (
+            "execute_tool_call" if isinstance(s["messages"][-1], AIMessage) and s["messages"][-1].tool_calls else END
+        ),
+        ["execute_tool_call", "format_api_params", END],
+    )
+    workflow.add_edge("execute_tool_call", "format_api_params")
+    workflow.add_edge("format_api_params", "finalize_tool_run")
+    workflow.add_edge("finalize_tool_run", END)
+
+    return workflow.compile(checkpointer=memory)
+
+
+_graph = None
+_graph_lock = threading.Lock()
+
+
+def get_graph():
+    """Build and compile the graph on first use; later calls return the same instance.
+
+    The lock keeps concurrent first callers (worker threads) from compiling
+    separate graphs, each with its own MemorySaver.
+    """
+    global _graph
+    with _graph_lock:
+        if _graph is None:
+            _graph = _build_graph()
+        return _graph
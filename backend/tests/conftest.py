@@ -0,0 +1,6 @@
+# backend/tests/conftest.py
+# Backend modules import each other by bare name (`from sessions import ...`).
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,36 @@
+# backend/tests/test_analytics.py
+import pandas as pd
+
+from analytics import TrendAnalytics
+
+TRANSPARENCY = [
+    {"ad_creative_id": "CR1", "advertiser_name": "Nike", "title": "Nike Pegasus running", "run_date": "20240422"},
+    {"ad_creative_id": "CR2", "advertiser_name": "Nike", "title": "Air Max running", "first_shown": 1713744000},
+]
+NAVER = [{"site": "musinsa.com", "title": "Nike exclusive drop", "link": "https://www.musinsa.com/brands/nike"}]
+
+
+def test_repeated_searches_are_counted_once():
+    a = TrendAnalytics()
+    assert a.ingest("google_ads_transparency_center", TRANSPARENCY) == 2
+    assert a.ingest("google_ads_transparency_center", TRANSPARENCY) == 0
+    assert a.ingest("naver", NAVER + NAVER) == 1
+    assert a.total == 3
+    assert a.duplicates == 3
+    assert a.top_keywords()["running"] == 2
+
+
+def test_run_dates_parse_per_field():
+    a = TrendAnalytics()
+    a.ingest("google_ads_transparency_center", TRANSPARENCY)
+    table = a.ads_per_advertiser(freq="D")
+    assert list(table.index) == [pd.Timestamp("2024-04-22")]
+    assert table.loc["2024-04-22", "Nike"] == 2
+
+
+def test_undated_creatives_stay_out_of_the_time_series():
+    a = TrendAnalytics()
+    a.ingest("naver", NAVER)
+    assert a.ads_per_advertiser().empty
+    assert a.to_dict()["undated_per_advertiser"] == {"musinsa.com": 1}
+    assert a.advertiser_totals()["musinsa.com"] == 1
@@ -0,0 +1,38 @@
+# backend/tests/test_export.py
+import csv
+import os
+
+import pyarrow.dataset as ds
+import pytest
+
+from export import CreativeExporter, ExportSink
+
+ADS = [{"position": i, "title": f"Ad {i}", "link": f"https://example.com/{i}"} for i in range(5)]
+
+
+@pytest.mark.parametrize("fmt, compression", [("csv", "zstd"), ("arrow", "gzip"), ("arrow", "snappy"),
+                                              ("parquet", "bogus")])
+def test_unsupported_compression_is_rejected_up_front(tmp_path, fmt, compression):
+    with pytest.raises(ValueError, match="Unsupported compression"):
+        CreativeExporter(str(tmp_path / f"naver.{fmt}"), "naver", fmt, compression=compression)
+
+
+def test_sink_rolls_parquet_parts(tmp_path):
+    sink = ExportSink(str(tmp_path), "parquet", compression="zstd")
+    sink("naver", ADS)
+    sink.roll()
+    sink("naver", ADS)
+    assert sink.close() == {"naver": 10}
+    parts = sorted(os.listdir(tmp_path / "naver.parquet"))
+    assert parts == ["part-00000.parquet", "part-00001.parquet"]
+    assert ds.dataset(str(tmp_path / "naver.parquet")).count_rows() == 10
+
+
+def test_csv_append_writes_one_header(tmp_path):
+    path = str(tmp_path / "naver.csv")
+    for _ in range(2):
+        with CreativeExporter(path, "naver", "csv", append=True) as exporter:
+            exporter.write(ADS)
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert [r["title"] for r in rows] == [a["title"] for a in ADS] * 2
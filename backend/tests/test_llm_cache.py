@@ -0,0 +1,41 @@
+# backend/tests/test_llm_cache.py
+import sqlite3
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from llm_cache import CachedChatModel, LLMResponseCache
+
+
+class CountingLLM:
+    def __init__(self):
+        self.calls = 0
+
+    def invoke(self, messages, *args, **kwargs):
+        self.calls += 1
+        return AIMessage(content=f"reply {self.calls}")
+
+
+def test_identical_history_is_served_from_cache(tmp_path):
+    llm = CountingLLM()
+    model = CachedChatModel(llm, LLMResponseCache(str(tmp_path / "cache.sqlite3")))
+    first = model.invoke([HumanMessage(content="hi")])
+    second = model.invoke([HumanMessage(content="  hi ")])
+    assert llm.calls == 1
+    assert second.content == first.content
+    assert "served_from" not in first.response_metadata
+    assert second.response_metadata["served_from"] == "cache"
+    assert model.cache.metrics()["hits"] == 1
+
+
+def test_sqlite_errors_fail_open(tmp_path):
+    cache = LLMResponseCache(str(tmp_path / "cache.sqlite3"))
+
+    def locked(*args):
+        raise sqlite3.OperationalError("database is locked")
+
+    cache.get = cache.put = locked
+    llm = CountingLLM()
+    model = CachedChatModel(llm, cache)
+    assert model.invoke([HumanMessage(content="hi")]).content == "reply 1"
+    assert llm.calls == 1
+    assert cache.metrics()["errors"] == 2
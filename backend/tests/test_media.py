@@ -0,0 +1,100 @@
+# backend/tests/test_media.py
+import http.server
+import io
+import threading
+from urllib.parse import urlparse
+
+import pytest
+from PIL import Image
+
+import media
+from media import MediaCache, UnsafeURL, check_url
+
+
+def _png():
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 64), "red").save(buf, "PNG")
+    return buf.getvalue()
+
+
+PNG = _png()
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """Local image server; every host "resolves" to it, as a vetted public address would."""
+    requests_seen = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests_seen.append((self.headers["Host"], self.path))
+            if self.path == "/redirect":
+                self.send_response(302)
+                self.send_header("Location", "/img.png")
+                self.end_headers()
+                return
+            body, content_type = (b"<html></html>", "text/html") if self.path == "/page" else (PNG, "image/png")
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    srv = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    monkeypatch.setattr(media, "resolve_public", lambda url: (urlparse(url), "127.0.0.1"))
+    yield f"http://cdn.example.com:{srv.server_address[1]}", requests_seen
+    srv.shutdown()
+    srv.server_close()
+
+
+@pytest.mark.parametrize("url", [
+    "file:///etc/passwd",
+    "http://127.0.0.1/x.png",
+    "http://169.254.169.254/latest/meta-data",
+    "http://[::1]/x.png",
+    "http://10.0.0.1/x.png",
+])
+def test_check_url_rejects_non_public_targets(url):
+    with pytest.raises(UnsafeURL):
+        check_url(url)
+
+
+def test_fetch_is_pinned_and_follows_redirects(tmp_path, server):
+    base, seen = server
+    cache = MediaCache(str(tmp_path))
+    digest = cache.get(f"{base}/redirect")
+    assert digest is not None
+    assert cache.local_path(digest).endswith(".jpg")
+    assert [path for _, path in seen] == ["/redirect", "/img.png"]
+    assert {host for host, _ in seen} == {urlparse(base).netloc}
+
+    assert cache.get(f"{base}/redirect") == digest
+    assert len(seen) == 2
+    assert cache.stats["hits"] == 1
+
+
+def test_non_images_and_oversized_bodies_are_rejected(tmp_path, server):
+    base, _ = server
+    cache = MediaCache(str(tmp_path), max_object_bytes=len(PNG) - 1)
+    assert cache.get(f"{base}/page") is None
+    assert cache.get(f"{base}/img.png") is None
+    assert cache.stats["rejected"] == 2
+    assert cache.metrics()["objects"] == 0
+
+
+def test_failures_are_cached_until_the_ttl_expires(tmp_path, server):
+    base, seen = server
+    cache = MediaCache(str(tmp_path))
+    url = f"{base}/page"
+    assert cache.fetch_many([url, url]) == {url: None}
+    assert cache.get(url) is None
+    assert len(seen) == 1
+    assert cache.stats["failure_hits"] == 1
+
+    cache.failure_ttl = 0
+    assert cache.get(url) is None
+    assert len(seen) == 2
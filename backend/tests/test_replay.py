@@ -0,0 +1,70 @@
+# backend/tests/test_replay.py
+from typing import Annotated, TypedDict
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, message_to_dict
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import END, START, StateGraph
+from langgraph.graph.message import add_messages
+
+from replay import ReplayLLM, run_load
+
+
+class State(TypedDict):
+    messages: Annotated[list, add_messages]
+
+
+def _graph(fail=False):
+    llm = ReplayLLM()
+
+    def collect_user_input(state):
+        if fail:
+            raise RuntimeError("node failed")
+        return {"messages": [llm.invoke(state["messages"])]}
+
+    def finalize_tool_run(state):
+        return {"messages": [AIMessage(content="done")]}
+
+    builder = StateGraph(State)
+    builder.add_node("collect_user_input", collect_user_input)
+    builder.add_node("finalize_tool_run", finalize_tool_run)
+    builder.add_edge(START, "collect_user_input")
+    builder.add_edge("collect_user_input", "finalize_tool_run")
+    builder.add_edge("finalize_tool_run", END)
+    graph = builder.compile(checkpointer=MemorySaver())
+    return lambda: graph
+
+
+def _recording(users=3, turns=2):
+    return {
+        f"t{u}": [{"messages": [message_to_dict(HumanMessage(content=f"q{n}"))],
+                   "llm_replies": [message_to_dict(AIMessage(content=f"t{u} reply {n}"))]}
+                  for n in range(turns)]
+        for u in range(users)
+    }
+
+
+@pytest.mark.parametrize("pool_workers", [None, 2])
+def test_turns_run_through_the_session_manager(pool_workers):
+    getter = _graph()
+    report = run_load(_recording(), concurrency=3, graph_getter=getter, pool_workers=pool_workers)
+    assert report["errors"] == 0
+    assert report["turns"] == 6
+    assert report["node_latency_s"]["collect_user_input"]["count"] == 6
+    # The session manager re-seeds every thread to a single checkpoint.
+    checkpointer = getter().checkpointer
+    assert len(checkpointer.storage) == 3
+    for thread_id in checkpointer.storage:
+        state = getter().get_state({"configurable": {"thread_id": thread_id}})
+        replies = [m.content for m in state.values["messages"] if m.type == "ai" and m.content != "done"]
+        assert len(replies) == 2 and replies[0].endswith("reply 0") and replies[1].endswith("reply 1")
+        assert replies[0].split()[0] == replies[1].split()[0]
+
+
+def test_failures_are_counted_as_errors():
+    report = run_load(_recording(), concurrency=2, graph_getter=_graph(fail=True))
+    assert report["turns"] == 0
+    assert report["errors"] == 3
+
+    broken = {"t0": [{"messages": [message_to_dict(HumanMessage(content="q"))]}]}   # no llm_replies
+    assert run_load(broken, graph_getter=_graph())["errors"] == 1
@@ -0,0 +1,74 @@
+# backend/tests/test_resilience.py
+import time
+
+import pytest
+import requests
+
+from resilience import CircuitBreaker, CircuitOpen, EngineClient
+
+
+def test_breaker_opens_half_opens_and_closes():
+    breaker = CircuitBreaker(threshold=2, cooldown=0.05)
+    breaker.failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    # Only one probe until it reports back.
+    assert not breaker.allow()
+
+    breaker.success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_failed_probe_reopens_the_breaker():
+    breaker = CircuitBreaker(threshold=1, cooldown=0.05)
+    breaker.failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.failure()
+    assert breaker.state == "open"
+
+
+def _client_with_latencies(samples, **kwargs):
+    client = EngineClient(**kwargs)
+    latency, _, _ = client._engine("google_ads")
+    for seconds in samples:
+        latency.record(seconds)
+    return client
+
+
+def test_timeout_for_waits_for_min_samples():
+    client = _client_with_latencies([0.1] * 4, min_samples=5, max_timeout=30.0)
+    assert client.timeout_for("google_ads") == 30.0
+
+
+@pytest.mark.parametrize("latency, expected", [
+    (0.1, 3.0),    # p99 * headroom below the floor
+    (4.0, 6.0),    # inside the bounds
+    (40.0, 30.0),  # above the ceiling
+])
+def test_timeout_for_clamps_p99(latency, expected):
+    client = _client_with_latencies([latency] * 5, min_samples=5, min_timeout=3.0,
+                                    max_timeout=30.0, headroom=1.5)
+    assert client.timeout_for("google_ads") == pytest.approx(expected)
+
+
+def test_open_breaker_short_circuits_requests():
+    client = EngineClient(breaker_threshold=1, breaker_cooldown=60)
+    calls = []
+
+    def failing_get(engine, url, params, timeout, started_event=None):
+        calls.append(url)
+        raise requests.ConnectionError("refused")
+
+    client._timed_get = failing_get
+    with pytest.raises(requests.ConnectionError):
+        client.get("google_ads", "http://serpapi.invalid", {})
+    with pytest.raises(CircuitOpen):
+        client.get("google_ads", "http://serpapi.invalid", {})
+    assert len(calls) == 1
+    assert client._engine("google_ads")[2]["short_circuited"] == 1
@@ -0,0 +1,115 @@
+# backend/tests/test_sessions.py
+import threading
+import time
+from typing import Annotated, TypedDict
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import END, START, StateGraph
+from langgraph.graph.message import add_messages
+
+from sessions import EVICTED_PLACEHOLDER, QuotaExceeded, SessionManager, evict_tool_outputs
+
+
+class State(TypedDict):
+    messages: Annotated[list, add_messages]
+
+
+def _toy_graph(tool_output_chars=1000, gate=None):
+    """collect_user_input -> execute_tool_call -> finalize_tool_run, like the real graph."""
+    def collect_user_input(state):
+        if gate is not None:
+            gate.wait(5)
+        n = len(state["messages"])
+        return {"messages": [AIMessage(content="", tool_calls=[{"name": "ads", "args": {}, "id": f"c{n}"}])]}
+
+    def execute_tool_call(state):
+        call_id = state["messages"][-1].tool_calls[0]["id"]
+        return {"messages": [ToolMessage(content="x" * tool_output_chars, tool_call_id=call_id)]}
+
+    def finalize_tool_run(state):
+        return {"messages": [AIMessage(content="done")]}
+
+    builder = StateGraph(State)
+    builder.add_node("collect_user_input", collect_user_input)
+    builder.add_node("execute_tool_call", execute_tool_call)
+    builder.add_node("finalize_tool_run", finalize_tool_run)
+    builder.add_edge(START, "collect_user_input")
+    builder.add_edge("collect_user_input", "execute_tool_call")
+    builder.add_edge("execute_tool_call", "finalize_tool_run")
+    builder.add_edge("finalize_tool_run", END)
+    return builder.compile(checkpointer=MemorySaver())
+
+
+def _config(thread_id="t"):
+    return {"configurable": {"thread_id": thread_id}}
+
+
+def _turn(n):
+    return {"messages": [HumanMessage(content=f"question {n}")]}
+
+
+def test_evict_tool_outputs_keeps_the_latest_tool_output():
+    messages = [ToolMessage(content="a" * 100, tool_call_id="1", id="1"),
+                ToolMessage(content="b" * 100, tool_call_id="2", id="2"),
+                ToolMessage(content="c" * 100, tool_call_id="3", id="3")]
+    capped, evicted, total = evict_tool_outputs(messages, max_chars=150)
+    assert evicted == 2
+    assert capped[0].content == EVICTED_PLACEHOLDER.format(chars=100)
+    assert capped[2].content == "c" * 100
+    assert total == sum(len(m.content) for m in capped)
+    # Under the cap nothing changes.
+    assert evict_tool_outputs(messages, max_chars=10_000)[1] == 0
+
+
+def test_turns_leave_one_checkpoint_and_evict_old_tool_outputs():
+    graph = _toy_graph()
+    manager = SessionManager(graph_getter=lambda: graph, max_session_chars=1500)
+    for n in range(4):
+        manager.run_turn("u", _turn(n), _config())
+
+    assert len(list(graph.get_state_history(_config()))) == 1
+    state = graph.get_state(_config())
+    assert state.next == ()
+    tools = [m for m in state.values["messages"] if m.type == "tool"]
+    assert len(tools) == 4
+    assert all(m.content.startswith("[Earlier ad results removed") for m in tools[:-1])
+    assert tools[-1].content == "x" * 1000
+    assert manager.metrics()["evicted_messages"] == 3
+
+    # The re-seeded thread still runs the next turn from the start.
+    steps = manager.run_turn("u", _turn(4), _config())
+    assert [next(iter(step)) for step in steps] == ["collect_user_input", "execute_tool_call", "finalize_tool_run"]
+
+
+def test_user_over_quota_is_rejected():
+    gate = threading.Event()
+    graph = _toy_graph(gate=gate)
+    manager = SessionManager(graph_getter=lambda: graph, max_concurrent_per_user=1)
+    running = threading.Thread(target=manager.run_turn, args=("u", _turn(0), _config("t1")))
+    running.start()
+    try:
+        for _ in range(100):
+            if manager.metrics()["inflight"].get("u"):
+                break
+            time.sleep(0.01)
+        with pytest.raises(QuotaExceeded):
+            manager.run_turn("u", _turn(1), _config("t2"))
+        # Other users are unaffected.
+        gate.set()
+        manager.run_turn("v", _turn(0), _config("t3"))
+    finally:
+        gate.set()
+        running.join(5)
+    assert manager.metrics()["rejected"] == 1
+    assert manager.metrics()["inflight"] == {}
+
+
+def test_reap_idle_deletes_checkpoints():
+    graph = _toy_graph()
+    manager = SessionManager(graph_getter=lambda: graph, idle_ttl=-1)
+    manager.run_turn("u", _turn(0), _config())
+    assert manager.reap_idle() == ["t"]
+    assert list(graph.get_state_history(_config())) == []
+    assert manager.metrics()["active_sessions"] == 0
@@ -0,0 +1,106 @@
+# backend/tests/test_workers.py
+import os
+import threading
+import time
+
+import pytest
+
+from sessions import QuotaExceeded
+from workers import GraphWorkerPool, PoolSaturated
+
+
+def _config(thread_id):
+    return {"configurable": {"thread_id": thread_id}}
+
+
+def _crashing_runner(inputs, config):
+    if inputs.get("crash"):
+        os._exit(3)
+    return inputs["n"]
+
+
+def test_turns_of_one_session_run_in_order_and_never_overlap():
+    log, running = [], set()
+
+    def runner(inputs, config):
+        thread_id = config["configurable"]["thread_id"]
+        assert thread_id not in running
+        running.add(thread_id)
+        time.sleep(0.005)
+        log.append((thread_id, inputs["n"]))
+        running.discard(thread_id)
+        return inputs["n"]
+
+    pool = GraphWorkerPool(workers=4, runner=runner)
+    futures = [pool.submit({"n": n}, _config(t)) for n in range(10) for t in ("a", "b")]
+    assert [f.result(timeout=5) for f in futures] == [n for n in range(10) for _ in "ab"]
+    pool.shutdown()
+    for t in ("a", "b"):
+        assert [n for tid, n in log if tid == t] == list(range(10))
+
+
+def test_slow_session_does_not_block_others():
+    release = threading.Event()
+
+    def runner(inputs, config):
+        if config["configurable"]["thread_id"] == "slow":
+            release.wait(5)
+        return config["configurable"]["thread_id"]
+
+    pool = GraphWorkerPool(workers=2, runner=runner)
+    slow = pool.submit({}, _config("slow"))
+    # With fixed shards a third of these would queue behind "slow".
+    others = [pool.submit({}, _config(f"s{i}")) for i in range(6)]
+    assert [f.result(timeout=2) for f in others] == [f"s{i}" for i in range(6)]
+    assert not slow.done()
+    release.set()
+    assert slow.result(timeout=2) == "slow"
+    pool.shutdown()
+
+
+def test_full_pool_raises_pool_saturated():
+    release = threading.Event()
+    pool = GraphWorkerPool(workers=1, max_pending=2, runner=lambda inputs, config: release.wait(5))
+    pool.submit({}, _config("a"))
+    pool.submit({}, _config("b"))
+    with pytest.raises(PoolSaturated):
+        pool.submit({}, _config("c"), block=False)
+    with pytest.raises(PoolSaturated):
+        pool.submit({}, _config("c"), timeout=0.05)
+    release.set()
+    pool.shutdown()
+    assert pool.metrics()["rejected"] == 2
+    assert pool.metrics()["queue_depth"] == 0
+
+
+def test_one_user_cannot_fill_the_pool():
+    release = threading.Event()
+    pool = GraphWorkerPool(workers=1, max_pending=4, max_pending_per_user=2,
+                           runner=lambda inputs, config: release.wait(5))
+    user = {"configurable": {"thread_id": "t1", "user_id": "u"}}
+    first = [pool.submit({}, user), pool.submit({}, {"configurable": {"thread_id": "t2", "user_id": "u"}})]
+    # Rejected at admission, without waiting for a slot.
+    with pytest.raises(QuotaExceeded):
+        pool.submit({}, user, block=False)
+    other = pool.submit({}, _config("someone-else"))
+    release.set()
+    for f in first + [other]:
+        f.result(timeout=5)
+    # The count is released when turns finish.
+    assert pool.run({}, user, timeout=5) is True
+    pool.shutdown()
+    assert pool.metrics()["rejected"] == 1
+    assert pool.metrics()["active_users"] == 0
+
+
+def test_dead_process_fails_its_turns_and_is_restarted():
+    pool = GraphWorkerPool(workers=1, max_pending=2, mode="process", runner=_crashing_runner)
+    try:
+        assert pool.run({"n": 1}, _config("a"), timeout=30) == 1
+        with pytest.raises(RuntimeError, match="exited with code 3"):
+            pool.run({"crash": True}, _config("a"), timeout=30)
+        # Slots were released and the shard serves turns again.
+        assert [pool.run({"n": n}, _config("a"), timeout=30) for n in (2, 3)] == [2, 3]
+        assert pool.metrics()["restarts"] == 1
+    finally:
+        pool.shutdown()
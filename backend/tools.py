@@ -1,23 +1,87 @@
+import logging
 import os
-import json
 import requests
 from dotenv import load_dotenv
 from langchain.tools import tool
 
+from resilience import CircuitOpen, EngineClient
+from sessions import record_usage
 from schemas import (
     GoogleAdTransparencyParameters,
     NaverAdSearchParameters,
     GoogleAdSearchParameters,
     YouTubeAdSearchParameters,
+    country_to_code,
 )
 
 load_dotenv()
+logger = logging.getLogger(__name__)
 
 # helper ----------------------------------------------------------------------
 
 def _cap(items, n):
     return items if n is None else items[: n]
 
+
+SERPAPI_URL = os.getenv("SERPAPI_URL", "https://serpapi.com/search")
+
+# Optional `fn(query, status, body)` hook for recording calls (see replay.py).
+serpapi_recorder = None
+
+# Shared across the four tools: per-engine adaptive timeouts, optional hedged
+# requests (SERPAPI_HEDGE=1) and circuit breakers. See resilience.py.
+serpapi_client = EngineClient(
+    max_timeout=float(os.getenv("SERPAPI_MAX_TIMEOUT", "30")),
+    hedge=os.getenv("SERPAPI_HEDGE", "").lower() in ("1", "true", "yes"),
+    on_send=lambda engine: record_usage("serpapi_calls"),
+)
+
+
+def _serpapi_get(query: dict):
+    """Call SerpAPI; returns the decoded JSON body or an error string for the LLM."""
+    engine = query["engine"]
+    try:
+        r = serpapi_client.get(engine, SERPAPI_URL, {"api_key": os.getenv("SERPAPI_API_KEY"), **query})
+    except CircuitOpen as exc:
+        return f"SerpAPI error: {exc}"
+    except requests.Timeout:
+        return f"SerpAPI error: {engine} timed out"
+    except requests.RequestException as exc:
+        # The exception text carries the request URL, api_key included.
+        return f"SerpAPI error: {engine} unreachable ({type(exc).__name__})"
+    body = r.json() if r.status_code == 200 else None
+    if serpapi_recorder is not None:
+        serpapi_recorder(query, r.status_code, body)
+    if r.status_code != 200:
+        return f"SerpAPI error: {r.status_code} – {r.text}"
+    return body
+
+
+# Callbacks notified with (engine, ads, params) whenever a tool receives a
+# batch of raw creatives; used by analytics and other downstream consumers.
+_CREATIVE_LISTENERS = []
+
+
+def add_creative_listener(fn):
+    """Register `fn(engine, ads, params)` to receive every raw creative batch."""
+    if fn not in _CREATIVE_LISTENERS:
+        _CREATIVE_LISTENERS.append(fn)
+    return fn
+
+
+def remove_creative_listener(fn):
+    if fn in _CREATIVE_LISTENERS:
+        _CREATIVE_LISTENERS.remove(fn)
+
+
+def _publish(engine, ads, params):
+    # A failing consumer (analytics, export, ...) must not fail the search itself.
+    for fn in list(_CREATIVE_LISTENERS):
+        try:
+            fn(engine, ads, params)
+        except Exception:
+            logger.exception("Creative listener %r failed for engine %s", fn, engine)
+
 # ---------------------------------------------------------------------------- #
 # Google Ads Transparency Center                                               #
 # ---------------------------------------------------------------------------- #
@@ -40,24 +104,16 @@ def google_ad_transparency(params: GoogleAdTransparencyParameters) -> str:
 
     RETURNS: markdown string with one block per creative (title, advertiser,
     region, platform, run date)."""
-    api_key = os.getenv("SERPAPI_API_KEY")
-    with open("country_codes.json") as f:
-        COUNTRY_TO_CODE = {v: k for k, v in json.load(f).items()}
-
-    r = requests.get(
-        "https://serpapi.com/search",
-        params={
-            "api_key": api_key,
-            "engine": "google_ads_transparency_center",
-            **params.to_api_params(COUNTRY_TO_CODE),
-        },
-        timeout=30,
-    )
-    if r.status_code != 200:
-        return f"SerpAPI error: {r.status_code} – {r.text}"
-
-    ads = r.json().get("ad_creatives", [])
+    data = _serpapi_get({
+        "engine": "google_ads_transparency_center",
+        **params.to_api_params(country_to_code()),
+    })
+    if isinstance(data, str):
+        return data
+
+    ads = data.get("ad_creatives", [])
     limit = params.num or len(ads)
+    _publish("google_ads_transparency_center", _cap(ads, limit), params)
     return "\n\n".join(
         f"Ad {i+1}\nTitle: {a.get('title','N/A')}\nAdvertiser: {a.get('advertiser_name','N/A')}\nRegion: {a.get('region','N/A')}\nPlatform: {a.get('platform','N/A')}\nRun Date: {a.get('run_date','N/A')}"
         for i, a in enumerate(_cap(ads, limit))
@@ -81,17 +137,13 @@ def serpapi_naver_ad_search(params: NaverAdSearchParameters) -> str:
     - `num` — max ads (image vertical only)
 
     RETURNS: markdown blocks with title, description, site, link for each ad."""
-    api_key = os.getenv("SERPAPI_API_KEY")
-    r = requests.get(
-        "https://serpapi.com/search",
-        params={"api_key": api_key, **params.to_api_params()},
-        timeout=30,
-    )
-    if r.status_code != 200:
-        return f"SerpAPI error: {r.status_code} – {r.text}"
+    data = _serpapi_get(params.to_api_params())
+    if isinstance(data, str):
+        return data
 
-    ads = r.json().get("ads_results", [])
+    ads = data.get("ads_results", [])
     limit = getattr(params, "num", None) or len(ads)
+    _publish("naver", _cap(ads, limit), params)
     return "\n\n".join(
         f"Ad {i+1}\nTitle: {a.get('title','')}\nDescription: {a.get('description','')}\nSite: {a.get('site','')}\nLink: {a.get('link','')}"
         for i, a in enumerate(_cap(ads, limit))
@@ -115,17 +167,13 @@ def google_ads_search(params: GoogleAdSearchParameters) -> str:
     - `num` — max ads (default 10)
 
     RETURNS: markdown list with title, displayed URL, link for each ad."""
-    api_key = os.getenv("SERPAPI_API_KEY")
-    r = requests.get(
-        "https://serpapi.com/search",
-        params={"api_key": api_key, **params.to_api_params()},
-        timeout=30,
-    )
-    if r.status_code != 200:
-        return f"SerpAPI error: {r.status_code} – {r.text}"
+    data = _serpapi_get(params.to_api_params())
+    if isinstance(data, str):
+        return data
 
-    ads = r.json().get("ads", [])
+    ads = data.get("ads", [])
     limit = params.num or len(ads)
+    _publish("google", _cap(ads, limit), params)
     return "\n\n".join(
         f"Ad {i+1}\nTitle: {a.get('title','N/A')}\nDisplayed URL: {a.get('displayed_link','N/A')}\nLink: {a.get('link','N/A')}"
         for i, a in enumerate(_cap(ads, limit))
@@ -146,17 +194,13 @@ def youtube_ads_search(params: YouTubeAdSearchParameters) -> str:
     - `hl`, `gl`, `num`
 
     RETURNS: markdown list with title, channel, link for each ad."""
-    api_key = os.getenv("SERPAPI_API_KEY")
-    r = requests.get(
-        "https://serpapi.com/search",
-        params={"api_key": api_key, **params.to_api_params()},
-        timeout=30,
-    )
-    if r.status_code != 200:
-        return f"SerpAPI error: {r.status_code} – {r.text}"
+    data = _serpapi_get(params.to_api_params())
+    if isinstance(data, str):
+        return data
 
-    ads = r.json().get("ads_results", []) or r.json().get("top_ads", [])
+    ads = data.get("ads_results", []) or data.get("top_ads", [])
     limit = params.num or len(ads)
+    _publish("youtube", _cap(ads, limit), params)
     return "\n\n".join(
         f"Ad {i+1}\nTitle: {a.get('title','N/A')}\nChannel: {a.get('channel_name','N/A')}\nLink: {a.get('link','N/A')}"
         for i, a in enumerate(_cap(ads, limit))
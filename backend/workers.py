@@ -0,0 +1,352 @@
+# backend/workers.py
+"""Worker-pool execution mode for LangGraph turns.
+
+Turns of one session (`thread_id`) always run one at a time, in submission
+order. Total pending turns are bounded; callers either block or get
+`PoolSaturated` when full. Queued and running turns are also counted per user
+(`configurable.user_id`) at admission, so one tenant cannot fill every slot:
+extra turns are rejected with `QuotaExceeded` before they take a slot.
+
+In thread mode any idle worker picks up the next ready turn; a session with
+a turn in progress simply holds its later turns back. Turns are I/O-bound
+(LLM and SerpAPI calls of up to 30 s), so size GRAPH_WORKERS to the number of
+turns you want in flight at once, not to the CPU count.
+
+In process mode the `MemorySaver` checkpoints of a session live in one child,
+so sessions are sharded by `thread_id` onto a fixed set of processes. A slow
+turn then delays every session hashed to the same shard (head-of-line
+blocking); prefer thread mode unless turns are CPU-bound, and use more
+shards than cores if they are not.
+
+In process mode everything a turn touches lives in the child: creative
+listeners (analytics, export), the LLM response cache, `serpapi_client` and
+the session manager. The parent's /trends, /sessions/metrics and
+/serpapi/metrics therefore do not see turns run by process workers; use
+thread mode (the default) when those endpoints matter.
+"""
+import multiprocessing as mp
+import os
+import pickle
+import queue
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import Future, wait as wait_futures
+
+from sessions import QuotaExceeded
+
+_STOP = None
+
+
+class PoolSaturated(RuntimeError):
+    """Raised when a turn cannot be queued because the pool is at capacity."""
+
+
+# -----------------------------------------------------------------------------
+# Turn execution
+# -----------------------------------------------------------------------------
+
+def run_turn(inputs: dict, config: dict) -> list:
+    """Run one graph turn through the session manager and return its step updates.
+
+    The tenant is `configurable.user_id`, defaulting to the thread id.
+    """
+    from sessions import get_session_manager
+    configurable = config["configurable"]
+    user_id = configurable.get("user_id") or configurable["thread_id"]
+    return get_session_manager().run_turn(user_id, inputs, config)
+
+
+def _process_worker(jobs, results, runner):
+    """Child-process loop: pull (job_id, inputs, config), push (job_id, run seconds, result, error)."""
+    while True:
+        job = jobs.get()
+        if job is _STOP:
+            break
+        job_id, inputs, config = job
+        started = time.monotonic()
+        try:
+            result, error = runner(inputs, config), None
+        except Exception as exc:  # forwarded to the caller's future
+            result, error = None, exc
+        try:
+            pickle.dumps((result, error))
+        except Exception as exc:
+            # Queue.put pickles on a feeder thread and would drop the item silently.
+            result, error = None, RuntimeError(f"Turn result could not be pickled: {exc!r}")
+        results.put((job_id, time.monotonic() - started, result, error))
+
+
+# -----------------------------------------------------------------------------
+# Pool
+# -----------------------------------------------------------------------------
+
+class GraphWorkerPool:
+    """Bounded, per-session-ordered pool of graph workers.
+
+    mode="thread" runs turns on threads sharing the in-process graph;
+    mode="process" gives each shard its own interpreter and graph instance
+    (`runner` must then be a picklable module-level function). A shard whose
+    process dies is restarted; its pending turns fail with RuntimeError and
+    its sessions' checkpoints are lost.
+    """
+
+    LIVENESS_INTERVAL = 1.0   # seconds between child liveness checks when idle
+
+    def __init__(self, workers: int = 4, max_pending: int = 64, mode: str = "thread",
+                 runner=run_turn, max_pending_per_user: int | None = None):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unknown worker mode: {mode}")
+        self.mode = mode
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_pending_per_user = max_pending_per_user
+        self._runner = runner
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._futures = {}
+        self._per_user = {}   # user_id -> queued + running turns
+        self._next_id = 0
+        self._depths = [0] * workers   # per shard, process mode only
+        self._waits = deque(maxlen=1000)
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0, "restarts": 0}
+        self._closed = False
+
+        if mode == "thread":
+            self._ready = queue.Queue()
+            self._chains = {}   # thread_id -> turns waiting behind the session's running turn
+            self._threads = [
+                threading.Thread(target=self._thread_worker, daemon=True, name=f"graph-worker-{i}")
+                for i in range(workers)
+            ]
+        else:
+            self._ctx = mp.get_context("spawn")
+            self._queues = [self._ctx.Queue() for _ in range(workers)]
+            # One results queue per child: a child that dies while its feeder
+            # thread holds a queue's write lock would block every other writer.
+            self._results = [self._ctx.Queue() for _ in range(workers)]
+            self._procs = [self._spawn(i) for i in range(workers)]
+            self._threads = [
+                threading.Thread(target=self._collect_results, args=(i,), daemon=True, name=f"graph-results-{i}")
+                for i in range(workers)
+            ]
+        for t in self._threads:
+            t.start()
+
+    # Submission ----------------------------------------------------------------
+
+    def _shard(self, thread_id: str) -> int:
+        return zlib.crc32(str(thread_id).encode()) % self.workers
+
+    def submit(self, inputs: dict, config: dict, block: bool = True, timeout: float | None = None) -> Future:
+        """Queue a graph turn; the future resolves to the list of step updates.
+
+        Blocks while the pool is full (backpressure) unless `block=False` or
+        `timeout` elapses, in which case `PoolSaturated` is raised. Raises
+        `QuotaExceeded` at once if the user already has `max_pending_per_user`
+        turns queued or running.
+        """
+        if self._closed:
+            raise RuntimeError("Worker pool is shut down")
+        thread_id = config["configurable"]["thread_id"]
+        user_id = config["configurable"].get("user_id") or thread_id
+        with self._lock:
+            if self.max_pending_per_user is not None and self._per_user.get(user_id, 0) >= self.max_pending_per_user:
+                self._stats["rejected"] += 1
+                raise QuotaExceeded(
+                    f"User {user_id} already has {self.max_pending_per_user} requests queued or in progress"
+                )
+            self._per_user[user_id] = self._per_user.get(user_id, 0) + 1
+        if not self._slots.acquire(blocking=block, timeout=timeout if block else None):
+            with self._lock:
+                self._stats["rejected"] += 1
+                self._release_user(user_id)
+            raise PoolSaturated(f"Graph worker pool is full ({self.max_pending} pending turns)")
+
+        shard = self._shard(thread_id) if self.mode == "process" else None
+        future = Future()
+        with self._lock:
+            job_id = self._next_id
+            self._next_id += 1
+            self._futures[job_id] = (future, shard, time.monotonic(), user_id)
+            self._stats["submitted"] += 1
+            if shard is not None:
+                self._depths[shard] += 1
+                # Under the lock so a shard restart cannot slip in between.
+                self._queues[shard].put((job_id, inputs, config))
+            elif thread_id in self._chains:
+                self._chains[thread_id].append((job_id, thread_id, inputs, config))
+            else:
+                self._chains[thread_id] = deque()
+                self._ready.put((job_id, thread_id, inputs, config))
+        return future
+
+    def run(self, inputs: dict, config: dict, timeout: float | None = None) -> list:
+        """Submit a turn and wait for its result."""
+        return self.submit(inputs, config).result(timeout=timeout)
+
+    # Completion ----------------------------------------------------------------
+
+    def _release_user(self, user_id) -> None:
+        # Caller holds self._lock.
+        self._per_user[user_id] -= 1
+        if not self._per_user[user_id]:
+            del self._per_user[user_id]
+
+    def _finish(self, job_id, started, result, error) -> None:
+        with self._lock:
+            if job_id not in self._futures:  # already failed by a shard restart
+                return
+            future, shard, enqueued, user_id = self._futures.pop(job_id)
+            self._release_user(user_id)
+            if shard is not None:
+                self._depths[shard] -= 1
+            self._waits.append(started - enqueued)
+            self._stats["failed" if error else "completed"] += 1
+        self._slots.release()
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def _thread_worker(self) -> None:
+        while True:
+            job = self._ready.get()
+            if job is _STOP:
+                break
+            job_id, thread_id, inputs, config = job
+            started = time.monotonic()
+            try:
+                result, error = self._runner(inputs, config), None
+            except Exception as exc:
+                result, error = None, exc
+            with self._lock:
+                waiting = self._chains[thread_id]
+                if waiting:
+                    self._ready.put(waiting.popleft())
+                else:
+                    del self._chains[thread_id]
+            self._finish(job_id, started, result, error)
+
+    def _collect_results(self, shard: int) -> None:
+        while True:
+            try:
+                item = self._results[shard].get(timeout=self.LIVENESS_INTERVAL)
+            except queue.Empty:
+                if not self._closed and not self._procs[shard].is_alive():
+                    self._restart(shard)
+                continue
+            if item is _STOP:
+                break
+            self._finish_remote(item)
+
+    def _finish_remote(self, item) -> None:
+        # Child clocks are not comparable, so it reports run time instead.
+        job_id, elapsed, result, error = item
+        self._finish(job_id, time.monotonic() - elapsed, result, error)
+
+    # Process supervision -------------------------------------------------------
+
+    def _spawn(self, shard: int):
+        p = self._ctx.Process(target=_process_worker, daemon=True,
+                              args=(self._queues[shard], self._results[shard], self._runner))
+        p.start()
+        return p
+
+    def _restart(self, shard: int) -> None:
+        """Replace a dead child and fail the turns that were queued on it."""
+        dead, results = self._procs[shard], self._results[shard]
+        while True:   # results it sent before dying still count
+            try:
+                self._finish_remote(results.get_nowait())
+            except queue.Empty:
+                break
+        with self._lock:
+            lost = [job_id for job_id, (_, s, _, _) in self._futures.items() if s == shard]
+            self._queues[shard] = self._ctx.Queue()
+            self._results[shard] = self._ctx.Queue()
+            self._procs[shard] = self._spawn(shard)
+            self._stats["restarts"] += 1
+        error = RuntimeError(f"Graph worker {shard} exited with code {dead.exitcode}")
+        for job_id in lost:
+            self._finish(job_id, time.monotonic(), None, error)
+
+    # Metrics -------------------------------------------------------------------
+
+    def metrics(self) -> dict:
+        """Queue depth, wait-time percentiles (seconds) and job counters."""
+        with self._lock:
+            waits = sorted(self._waits)
+            pending = len(self._futures)
+            depths = list(self._depths)
+            sessions = len(self._chains) if self.mode == "thread" else None
+            users = len(self._per_user)
+            stats = dict(self._stats)
+
+        def pct(p):
+            return waits[min(len(waits) - 1, int(p * len(waits)))] if waits else 0.0
+
+        report = {
+            "mode": self.mode,
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "max_pending_per_user": self.max_pending_per_user,
+            "queue_depth": pending,
+            "active_users": users,
+            "wait_p50": pct(0.50),
+            "wait_p95": pct(0.95),
+            "wait_max": waits[-1] if waits else 0.0,
+            **stats,
+        }
+        if self.mode == "process":
+            report["queue_depth_per_worker"] = depths
+        else:
+            report["active_sessions"] = sessions
+        return report
+
+    # Lifecycle -----------------------------------------------------------------
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._closed = True
+        if self.mode == "thread":
+            if wait:
+                # Turns held back behind a session's running turn are not queued yet.
+                with self._lock:
+                    pending = [future for future, _, _, _ in self._futures.values()]
+                wait_futures(pending)
+            for _ in self._threads:
+                self._ready.put(_STOP)
+        else:
+            for q in self._queues:
+                q.put(_STOP)
+            for p in self._procs:
+                p.join() if wait else p.terminate()
+            for results in self._results:
+                results.put(_STOP)
+        if wait:
+            for t in self._threads:
+                t.join()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> GraphWorkerPool:
+    """Process-wide pool configured from GRAPH_WORKERS / GRAPH_WORKER_MODE / GRAPH_MAX_PENDING.
+
+    GRAPH_MAX_PENDING_PER_USER defaults to SESSION_MAX_CONCURRENT, the limit
+    the session manager enforces once a turn runs.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = GraphWorkerPool(
+                workers=int(os.getenv("GRAPH_WORKERS", "4")),
+                max_pending=int(os.getenv("GRAPH_MAX_PENDING", "64")),
+                mode=os.getenv("GRAPH_WORKER_MODE", "thread"),
+                max_pending_per_user=int(os.getenv("GRAPH_MAX_PENDING_PER_USER")
+                                         or os.getenv("SESSION_MAX_CONCURRENT", "2")),
+            )
+        return _pool